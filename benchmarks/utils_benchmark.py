@@ -0,0 +1,188 @@
+"""
+Time and peak memory budgets for the transformation utilities in shared/utils.
+
+Generates synthetic timesheet- and employee-shaped records, runs every utility over them, with its
+input prepared outside the measurement, and compares the results with the budgets in budgets.json. Exits with a non-zero status when a
+measurement exceeds its budget or has no budget, so it can gate a deploy.
+
+    python -m benchmarks.utils_benchmark                      # 10k and 100k rows
+    python -m benchmarks.utils_benchmark --sizes 1000000      # 1M rows, timed once per function
+    python -m benchmarks.utils_benchmark --record             # record the measurements as budgets
+
+Peak memory is measured with tracemalloc in a separate run from the timing, so it covers Python
+allocations only. Memory held by Arrow buffers is not included.
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import time
+import tracemalloc
+from typing import Any, Callable, Dict, List, Tuple
+
+from shared.utils.data_transformation import flatten_json, flatten_list_of_dicts, add_key_value_to_dicts
+from shared.utils.files import convert_dicts_to_csv, convert_dicts_to_parquet
+
+
+BUDGETS_PATH = os.path.join(os.path.dirname(__file__), "budgets.json")
+DEFAULT_SIZES = [10_000, 100_000]
+# Recorded budgets leave room for noise between runs and machines.
+RECORD_HEADROOM = 2.0
+# Budgets are never recorded below these, measurements close to zero are mostly noise.
+RECORD_FLOOR = {"seconds": 0.2, "peak_mib": 1.0}
+
+
+def generate_timesheets(rows: int, seed: int = 1) -> List[Dict[str, Any]]:
+    """
+    Generate records shaped like the nodes of the timesheets query.
+
+    :param rows: Number of records.
+    :param seed: Seed of the random generator, so runs are comparable.
+    :return: The records.
+    """
+    rng = random.Random(seed)
+    return [{
+        "dbId": 10_000_000 + index,
+        "assignmentDate": f"2024-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}",
+        "isHeaderApproved": rng.random() < 0.8,
+        "headerApprovedAt": "2024-06-10T11:47:40",
+        "owner": {"description": f"Owner {rng.randint(1, 50)}", "dbId": rng.randint(1, 50)},
+        "employee": {"code": f"E{rng.randint(1, 500):04d}", "description": f"Employee {rng.randint(1, 500)}", "dbId": rng.randint(1, 500)},
+        "activity": {"code": f"A{rng.randint(1, 40):03d}", "description": "Consulting"},
+        "timeType": {"code": rng.choice(["NORMAL", "OVERTIME", "TRAVEL"]), "description": "Time type"},
+        "workingHours": round(rng.uniform(0.5, 10.0), 2),
+    } for index in range(rows)]
+
+
+def generate_employees(rows: int, seed: int = 1) -> List[Dict[str, Any]]:
+    """
+    Generate records shaped like the nodes of the employees query, including a list field.
+
+    :param rows: Number of records.
+    :param seed: Seed of the random generator, so runs are comparable.
+    :return: The records.
+    """
+    rng = random.Random(seed)
+    return [{
+        "dbId": 20_000_000 + index,
+        "code": f"E{index:06d}",
+        "description": f"Employee {index}",
+        "email": f"employee{index}@example.com",
+        "employmentType": {"code": rng.choice(["FULL", "PART"]), "description": "Employment type"},
+        "glObject1": {"code": f"D{rng.randint(1, 20):02d}", "description": "Department"},
+        "contacts": [{"type": "PHONE", "value": f"+46{rng.randint(10**8, 10**9 - 1)}"} for _ in range(rng.randint(0, 3))],
+    } for index in range(rows)]
+
+
+GENERATORS = {"timesheets": generate_timesheets, "employees": generate_employees}
+
+
+def _cases(records: List[Dict[str, Any]]) -> Dict[str, Tuple[Callable[[], Any], Callable[[Any], Any]]]:
+    # Every case pairs the preparation of its input, which is not measured, with the measured function.
+    return {
+        "flatten_json": (lambda: records, lambda data: [flatten_json(record) for record in data]),
+        "flatten_list_of_dicts": (lambda: records, flatten_list_of_dicts),
+        "add_key_value_to_dicts": (lambda: flatten_list_of_dicts(records, explode_lists=False),
+                                   lambda data: add_key_value_to_dicts(data, "mutationType", "ADDED")),
+        "convert_dicts_to_parquet": (lambda: flatten_list_of_dicts(records, explode_lists=False),
+                                     lambda data: convert_dicts_to_parquet(data, {"mutationType": "ADDED"})),
+        "convert_dicts_to_csv": (lambda: flatten_list_of_dicts(records), convert_dicts_to_csv),
+    }
+
+
+def measure(function: Callable[[Any], Any], data: Any, repeat: int) -> Dict[str, float]:
+    """
+    Measure the best wall time over `repeat` runs and the peak traced memory of one run.
+
+    :param function: The function to measure.
+    :param data: The input of the function, prepared outside the measurement.
+    :param repeat: Number of timed runs.
+    :return: The time in seconds and the peak memory in MiB.
+    """
+    seconds = float("inf")
+    for _ in range(repeat):
+        started = time.perf_counter()
+        function(data)
+        seconds = min(seconds, time.perf_counter() - started)
+
+    tracemalloc.start()
+    try:
+        function(data)
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    return {"seconds": round(seconds, 4), "peak_mib": round(peak / 2**20, 2)}
+
+
+def run(sizes: List[int], repeat: int) -> Dict[str, Dict[str, float]]:
+    """
+    Measure every utility for every record shape and size.
+
+    :param sizes: Numbers of rows.
+    :param repeat: Number of timed runs per measurement.
+    :return: Measurements keyed by 'function/shape/rows'.
+    """
+    results = {}
+    for shape, generate in GENERATORS.items():
+        for rows in sizes:
+            records = generate(rows)
+            for function_name, (prepare, function) in _cases(records).items():
+                key = f"{function_name}/{shape}/{rows}"
+                results[key] = measure(function, prepare(), repeat if rows < 1_000_000 else 1)
+                print(f"{key:<50} {results[key]['seconds']:>9.4f} s {results[key]['peak_mib']:>10.2f} MiB", flush=True)
+    return results
+
+
+def check(results: Dict[str, Dict[str, float]], budgets: Dict[str, Dict[str, float]]) -> List[str]:
+    """
+    Compare measurements with their budgets.
+
+    :param results: The measurements.
+    :param budgets: The budgets.
+    :return: A description of every exceeded or missing budget.
+    """
+    failures = []
+    for key, result in results.items():
+        budget = budgets.get(key)
+        if budget is None:
+            failures.append(f"{key}: no budget recorded, record one with --record")
+            continue
+        for metric in ("seconds", "peak_mib"):
+            if result[metric] > budget[metric]:
+                failures.append(f"{key}: {metric} {result[metric]} exceeds budget {budget[metric]}")
+    return failures
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=DEFAULT_SIZES, help="Numbers of rows to generate.")
+    parser.add_argument("--repeat", type=int, default=5, help="Number of timed runs, the best one counts.")
+    parser.add_argument("--record", action="store_true", help="Record the measurements as the new budgets.")
+    args = parser.parse_args()
+
+    results = run(args.sizes, args.repeat)
+
+    budgets = {}
+    if os.path.exists(BUDGETS_PATH):
+        with open(BUDGETS_PATH) as f:
+            budgets = json.load(f)
+
+    if args.record:
+        for key, result in results.items():
+            budgets[key] = {metric: round(max(value * RECORD_HEADROOM, RECORD_FLOOR[metric]), 4)
+                            for metric, value in result.items()}
+        with open(BUDGETS_PATH, "w") as f:
+            json.dump(dict(sorted(budgets.items())), f, indent=2)
+            f.write("\n")
+        print(f"Recorded {len(results)} budgets in {BUDGETS_PATH}.")
+        return 0
+
+    failures = check(results, budgets)
+    for failure in failures:
+        print(failure, file=sys.stderr)
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -13,6 +13,7 @@ GET_EMPLOYEES_FROM_DBIDS = gql("""
             edges {
                 cursor
                 node {
+                    dbId
                     email
                     description
                     employmentType {
@@ -59,6 +60,7 @@ GET_EMPLOYEES_AFTER_CURSOR = gql("""
             edges {
                 cursor
                 node {
+                    dbId
                     email
                     description
                     employmentType {
@@ -1,12 +1,19 @@
 from azure import functions as func
+import asyncio
+import logging
 import os
+from datetime import datetime, timezone
 
-from shared.data_lake_writer import DataLakeWriter
-from shared.configuration_manager import SynchronizerStateManager
-from shared.delta_fetcher import DeltaFetcher
-from shared.item_fetcher import ItemFetcher
-from shared.data_syncronizer import DataSynchronizer
-from shared.gql_client import GraphQLClient
+from shared.data_lake_writer import AsyncDataLakeWriter
+from shared.configuration_manager import AsyncSynchronizerStateManager
+from shared.delta_fetcher import AsyncDeltaFetcher
+from shared.item_fetcher import AsyncItemFetcher
+from shared.data_syncronizer import AsyncDataSynchronizer
+from shared.gql_client import AsyncGraphQLClient
+from shared.gql_recording import create_transport_from_environment
+from shared.lease_manager import AsyncDataLakeLease
+from shared.change_probe import register_entity, has_pending_changes
+from shared.adaptive_scheduler import AdaptiveScheduler
 
 from functions.employees.queries import (
     GET_EMPLOYEE_DELTAS,
@@ -16,14 +23,26 @@ from functions.employees.queries import (
 
 
 NAME = "employees"
+DELTA_WINDOW_SIZE = 10000
+SCHEDULER = AdaptiveScheduler(min_interval=60 * 60, max_interval=24 * 60 * 60, busy_threshold=10)
 
 bp = func.Blueprint()
 
+register_entity(NAME, "employee_deltas")
+
+
+async def schedule_next_run(state_manager: AsyncSynchronizerStateManager, delta_count: int, started_at: datetime) -> None:
+    interval = SCHEDULER.next_interval(await state_manager.get_sync_interval(), delta_count)
+    await state_manager.set_sync_interval(interval)
+    await state_manager.set_next_sync_at(SCHEDULER.next_sync_at(interval, started_at))
+
 
 @bp.function_name("SyncronizeEmployees")
 @bp.schedule(schedule="0 0 * * * *", arg_name="myTimer", run_on_startup=True,
               use_monitor=False) 
-def syncronize_employees(myTimer: func.TimerRequest) -> None:
+async def syncronize_employees(myTimer: func.TimerRequest) -> None:
+    started_at = datetime.now(timezone.utc)
+
     # Get environment variables.
     api_endpoint = os.getenv("Endpoint")
     api_key = os.getenv("APIKey")
@@ -31,24 +50,47 @@ def syncronize_employees(myTimer: func.TimerRequest) -> None:
     data_lake_account_key = os.getenv("DataLakeAccountKey")
     state_manager_connection_string = os.getenv("StateManagerConnectionString")
 
-    # Initialize classes needed for syncronizing data.
-    grapql_client = GraphQLClient(api_endpoint, api_key)
-    data_lake_writer = DataLakeWriter(data_lake_account_name, data_lake_account_key)
-    delta_fetcher = DeltaFetcher(grapql_client, GET_EMPLOYEE_DELTAS)
-    item_fetcher = ItemFetcher(grapql_client, GET_EMPLOYEES_FROM_DBIDS, GET_EMPLOYEES_AFTER_CURSOR)
-    state_manager = SynchronizerStateManager(state_manager_connection_string, f"{NAME}-")
-
-    # Initialize the data syncronizer.
-    syncronizer = DataSynchronizer(
-        NAME, 
-        delta_fetcher,
-        item_fetcher,
-        data_lake_writer,
-        state_manager
-    )
-
-    # Syncronize the data.
-    if not syncronizer.state_manager.initial_sync_complete:
-        syncronizer.syncronize(sync_from_scratch = True)
-    else:
-        syncronizer.syncronize(sync_from_scratch = False)
\ No newline at end of file
+    async with AsyncSynchronizerStateManager(state_manager_connection_string, f"{NAME}-") as state_manager:
+        # The timer fires at the shortest interval, the scheduler decides if this run is due.
+        if not SCHEDULER.is_due(await state_manager.get_next_sync_at()):
+            logging.info(f"Syncronization of {NAME} is not due yet.")
+            return
+
+        # Skip the run when the shared probe found no new deltas.
+        if not await asyncio.to_thread(has_pending_changes, NAME, api_endpoint, api_key, state_manager_connection_string):
+            logging.info(f"No changes found for {NAME}.")
+            await schedule_next_run(state_manager, 0, started_at)
+            return
+
+        # Initialize classes needed for syncronizing data.
+        transport = create_transport_from_environment(api_endpoint, api_key)
+        async with AsyncGraphQLClient(api_endpoint, api_key, transport=transport) as grapql_client, \
+                AsyncDataLakeWriter(data_lake_account_name, data_lake_account_key) as data_lake_writer:
+            delta_fetcher = AsyncDeltaFetcher(grapql_client, GET_EMPLOYEE_DELTAS)
+            item_fetcher = AsyncItemFetcher(grapql_client, GET_EMPLOYEES_FROM_DBIDS, GET_EMPLOYEES_AFTER_CURSOR)
+
+            # Initialize the data syncronizer.
+            syncronizer = AsyncDataSynchronizer(
+                NAME,
+                delta_fetcher,
+                item_fetcher,
+                data_lake_writer,
+                state_manager,
+                delta_window_size=DELTA_WINDOW_SIZE,
+                explode_lists=False,
+                sort_key="dbId"
+            )
+
+            # Only one instance may syncronize an entity at a time.
+            async with AsyncDataLakeLease(data_lake_writer, "filesystem", NAME) as lease:
+                if not lease.acquired:
+                    logging.info(f"Skipping syncronization of {NAME}, another instance is working on it.")
+                    return
+                syncronizer.lease = lease
+
+                # Syncronize the data, from scratch if the initial sync has not completed.
+                if not await state_manager.get_initial_sync_complete():
+                    await syncronizer.syncronize(sync_from_scratch = True)
+                else:
+                    await syncronizer.syncronize(sync_from_scratch = False)
+                    await schedule_next_run(state_manager, syncronizer.delta_count, started_at)
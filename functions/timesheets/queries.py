@@ -86,6 +86,24 @@ GET_TIMESHEETS_AFTER_CURSOR = gql("""
     }
 """)
 
+# Columns of the CSV export, the flattened fields of GET_TIMESHEETS_AFTER_CURSOR.
+TIMESHEET_CSV_COLUMNS = [
+    "dbId",
+    "assignmentDate",
+    "isHeaderApproved",
+    "headerApprovedAt",
+    "owner.description",
+    "owner.dbId",
+    "employee.code",
+    "employee.description",
+    "employee.dbId",
+    "activity.code",
+    "activity.description",
+    "timeType.code",
+    "timeType.description",
+    "workingHours",
+]
+
 GET_TIMESHEET_DELTAS = gql("""
     query getTimesheetDeltas($first: Int, $last: Int, $after: String) {
         timesheet_deltas(
@@ -105,4 +123,23 @@ GET_TIMESHEET_DELTAS = gql("""
             }
         }
     }
-""")
\ No newline at end of file
+""")
+
+GET_TIMESHEET_IDS_AFTER_CURSOR = gql("""
+    query getTimesheetIds($first: Int, $after: String) {
+        timesheets(
+            first: $first,
+            after: $after
+        ) {
+            edges {
+                node {
+                    dbId
+                }
+                cursor
+            }
+            pageInfo {
+                hasNextPage
+            }
+        }
+    }
+""")
@@ -0,0 +1,37 @@
+from typing import Any, Dict, Tuple
+
+from shared.data_lake_writer import DataLakeWriter
+from shared.rollups import IncrementalRollup
+
+
+def _code(item: Dict[str, Any], field: str) -> Any:
+    return (item.get(field) or {}).get('code')
+
+
+def working_hours_key(item: Dict[str, Any]) -> Tuple:
+    """
+    Group key of a timesheet: employee, month of the assignment date, activity and time type.
+    """
+    employee_db_id = (item.get('employee') or {}).get('dbId')
+    month = (item.get('assignmentDate') or '')[:7] or None
+    return (employee_db_id, month, _code(item, 'activity'), _code(item, 'timeType'))
+
+
+def create_working_hours_rollup(data_lake_writer: DataLakeWriter, name: str) -> IncrementalRollup:
+    """
+    Create the rollup of workingHours per employee, month, activity and time type.
+
+    :param data_lake_writer: Writer used to load and persist the rollup.
+    :param name: Name of the timesheets entity.
+    :return: The rollup.
+    """
+    return IncrementalRollup(
+        "working_hours_by_month",
+        data_lake_writer,
+        "filesystem",
+        name,
+        dimensions=["employeeDbId", "month", "activityCode", "timeTypeCode"],
+        key_function=working_hours_key,
+        measure="workingHours",
+        value_function=lambda item: item.get('workingHours')
+    )
@@ -1,56 +1,177 @@
 from azure import functions as func
+import json
 import logging
 import os
+from datetime import datetime, timezone
 
 from shared.data_lake_writer import DataLakeWriter
 from shared.configuration_manager import SynchronizerStateManager
+from shared.content_hash_index import ContentHashIndex
+from shared.dbid_index import DbIdIndex
 from shared.delta_fetcher import DeltaFetcher
 from shared.item_fetcher import ItemFetcher
 from shared.data_syncronizer import DataSynchronizer
 from shared.gql_client import GraphQLClient
+from shared.gql_recording import create_transport_from_environment
+from shared.lease_manager import DataLakeLease
+from shared.change_probe import register_entity, has_pending_changes
+from shared.adaptive_scheduler import AdaptiveScheduler
+from shared.work_queue import StorageWorkQueue
+from shared.profiling import RunProfiler
 
 from functions.timesheets.queries import (
     GET_TIMESHEET_DELTAS,
     GET_TIMESHEETS_AFTER_CURSOR,
-    GET_TIMESHEETS_FROM_DBIDS
+    GET_TIMESHEETS_FROM_DBIDS,
+    GET_TIMESHEET_IDS_AFTER_CURSOR,
+    TIMESHEET_CSV_COLUMNS
 )
+from functions.timesheets.rollups import create_working_hours_rollup
 
 
 NAME = "timesheets"
+DELTA_WINDOW_SIZE = 10000
+SCHEDULER = AdaptiveScheduler(min_interval=10 * 60, max_interval=2 * 60 * 60)
+CHUNK_QUEUE_NAME = f"{NAME}-chunks"
 
 logging.basicConfig(level=logging.INFO)
 
 bp = func.Blueprint()
 
-@bp.function_name("SyncronizeTimesheets")
-@bp.schedule(schedule="0 0 * * * *", arg_name="myTimer", run_on_startup=True,
-              use_monitor=False) 
-def syncronize_timesheets(myTimer: func.TimerRequest) -> None:
+register_entity(NAME, "timesheet_deltas")
+
+def distributed_sync_enabled() -> bool:
+    return os.getenv("DistributedSync", "false").lower() == "true"
+
+
+def csv_export_enabled() -> bool:
+    return os.getenv("CsvExport", "false").lower() == "true"
+
+
+def create_state_manager() -> SynchronizerStateManager:
+    return SynchronizerStateManager(os.getenv("StateManagerConnectionString"), f"{NAME}-")
+
+
+def create_syncronizer(use_indexes: bool = True, state_manager: SynchronizerStateManager = None) -> DataSynchronizer:
     # Get environment variables.
     api_endpoint = os.getenv("Endpoint")
     api_key = os.getenv("APIKey")
     data_lake_account_name = os.getenv("DataLakeAccountName")
     data_lake_account_key = os.getenv("DataLakeAccountKey")
-    state_manager_connection_string = os.getenv("StateManagerConnectionString")
 
     # Initialize classes needed for syncronizing data.
-    grapql_client = GraphQLClient(api_endpoint, api_key)
+    grapql_client = GraphQLClient(api_endpoint, api_key, transport=create_transport_from_environment(api_endpoint, api_key))
     data_lake_writer = DataLakeWriter(data_lake_account_name, data_lake_account_key)
     delta_fetcher = DeltaFetcher(grapql_client, GET_TIMESHEET_DELTAS)
-    item_fetcher = ItemFetcher(grapql_client, GET_TIMESHEETS_FROM_DBIDS, GET_TIMESHEETS_AFTER_CURSOR)
-    state_manager = SynchronizerStateManager(state_manager_connection_string, f"{NAME}-")
+    item_fetcher = ItemFetcher(grapql_client, GET_TIMESHEETS_FROM_DBIDS, GET_TIMESHEETS_AFTER_CURSOR, GET_TIMESHEET_IDS_AFTER_CURSOR)
+    state_manager = state_manager or create_state_manager()
+    content_hash_index = ContentHashIndex(data_lake_writer, "filesystem", f"{NAME}/_state") if use_indexes else None
+    dbid_index = DbIdIndex(data_lake_writer, "filesystem", f"{NAME}/_state") if use_indexes else None
+    rollups = [create_working_hours_rollup(data_lake_writer, NAME)] if use_indexes else None
 
     # Initialize the data syncronizer.
-    syncronizer = DataSynchronizer(
+    return DataSynchronizer(
         NAME, 
         delta_fetcher,
         item_fetcher,
         data_lake_writer,
-        state_manager
+        state_manager,
+        delta_window_size=DELTA_WINDOW_SIZE,
+        explode_lists=False,
+        sort_key="dbId",
+        content_hash_index=content_hash_index,
+        dbid_index=dbid_index,
+        rollups=rollups,
+        profiler=RunProfiler.from_environment(NAME, data_lake_writer)
     )
 
-    # Syncronize the data.
+
+def schedule_next_run(state_manager: SynchronizerStateManager, delta_count: int, started_at: datetime) -> None:
+    interval = SCHEDULER.next_interval(state_manager.sync_interval, delta_count)
+    state_manager.sync_interval = interval
+    state_manager.next_sync_at = SCHEDULER.next_sync_at(interval, started_at)
+
+
+@bp.function_name("SyncronizeTimesheets")
+@bp.schedule(schedule="0 */10 * * * *", arg_name="myTimer", run_on_startup=True,
+              use_monitor=False) 
+def syncronize_timesheets(myTimer: func.TimerRequest) -> None:
+    started_at = datetime.now(timezone.utc)
+    state_manager = create_state_manager()
+
+    # The timer fires at the shortest interval, the scheduler decides if this run is due.
+    if not SCHEDULER.is_due(state_manager.next_sync_at):
+        logging.info(f"Syncronization of {NAME} is not due yet.")
+        return
+
+    # Skip the run when the shared probe found no new deltas.
+    if not has_pending_changes(NAME, os.getenv("Endpoint"), os.getenv("APIKey"), os.getenv("StateManagerConnectionString")):
+        logging.info(f"No changes found for {NAME}.")
+        schedule_next_run(state_manager, 0, started_at)
+        return
+
+    # The clients and indexes are only set up for a run that has work to do.
+    distributed = distributed_sync_enabled()
+    syncronizer = create_syncronizer(use_indexes=not distributed, state_manager=state_manager)
+
+    # Only one instance may syncronize an entity at a time.
+    with DataLakeLease(syncronizer.data_lake_writer, "filesystem", NAME) as lease:
+        if not lease.acquired:
+            logging.info(f"Skipping syncronization of {NAME}, another instance is working on it.")
+            return
+        syncronizer.lease = lease
+
+        # Syncronize the data, fanning the changes out to queue workers in distributed mode.
+        if not state_manager.initial_sync_complete:
+            syncronizer.syncronize(sync_from_scratch = True)
+        elif distributed:
+            queue = StorageWorkQueue(os.getenv("AzureWebJobsStorage"), CHUNK_QUEUE_NAME)
+            # A run skipped for a pending batch says nothing about the change rate, so the interval is kept.
+            if syncronizer.dispatch_changes(queue):
+                schedule_next_run(state_manager, syncronizer.delta_count, started_at)
+        else:
+            syncronizer.syncronize(sync_from_scratch = False)
+            schedule_next_run(state_manager, syncronizer.delta_count, started_at)
+
+
+@bp.function_name("ReconcileTimesheets")
+@bp.schedule(schedule="0 30 3 * * *", arg_name="myTimer", run_on_startup=False,
+              use_monitor=False) 
+def reconcile_timesheets(myTimer: func.TimerRequest) -> None:
+    syncronizer = create_syncronizer()
+
+    # Reconciliation only makes sense once the initial load is in the lake.
     if not syncronizer.state_manager.initial_sync_complete:
-        syncronizer.syncronize(sync_from_scratch = True)
-    else:
-        syncronizer.syncronize(sync_from_scratch = False)
\ No newline at end of file
+        logging.info(f"Skipping reconciliation of {NAME}, initial sync is not complete.")
+        return
+
+    # Reconciliation writes to the same files and indexes as the syncronization.
+    with DataLakeLease(syncronizer.data_lake_writer, "filesystem", NAME) as lease:
+        if not lease.acquired:
+            logging.info(f"Skipping reconciliation of {NAME}, another instance is working on it.")
+            return
+        syncronizer.lease = lease
+
+        # Retry the dead-lettered dbIds first, reconciliation then repairs whatever is still missing.
+        syncronizer.retry_dead_letters()
+        syncronizer.reconcile()
+
+
+@bp.function_name("ExportTimesheetsCsv")
+@bp.schedule(schedule="0 30 4 * * *", arg_name="myTimer", run_on_startup=False,
+              use_monitor=False) 
+def export_timesheets_csv(myTimer: func.TimerRequest) -> None:
+    # Only consumers that cannot read Parquet need the export, so it is off unless configured.
+    if not csv_export_enabled():
+        return
+
+    syncronizer = create_syncronizer(use_indexes=False)
+    file_name = syncronizer.export_csv(TIMESHEET_CSV_COLUMNS)
+    logging.info(f"Exported {NAME} to {file_name}.")
+
+
+@bp.function_name("ProcessTimesheetChunks")
+@bp.queue_trigger(arg_name="msg", queue_name=CHUNK_QUEUE_NAME, connection="AzureWebJobsStorage")
+def process_timesheet_chunks(msg: func.QueueMessage) -> None:
+    syncronizer = create_syncronizer(use_indexes=False)
+    syncronizer.process_chunk(json.loads(msg.get_body().decode('utf-8')))
@@ -0,0 +1,67 @@
+from datetime import datetime, timedelta, timezone
+
+
+class AdaptiveScheduler:
+    """
+    Adapts how often an entity is synchronized to how much it changes.
+
+    The timer of an entity fires at its shortest allowed interval and asks the scheduler whether
+    a run is due. After each run the interval is halved when the run saw at least `busy_threshold`
+    delta events, doubled when it saw none, and kept otherwise, always within the configured bounds.
+    The interval and the time of the next run are kept in the entity's state.
+    """
+
+    def __init__(self, min_interval: int, max_interval: int, busy_threshold: int = 100) -> None:
+        """
+        Initialize the AdaptiveScheduler.
+
+        :param min_interval: Shortest interval between runs in seconds, should match the timer schedule.
+        :param max_interval: Longest interval between runs in seconds.
+        :param busy_threshold: Number of delta events in a run that makes the interval shorter.
+        """
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.busy_threshold = busy_threshold
+
+    def is_due(self, next_sync_at: str, now: datetime = None) -> bool:
+        """
+        Tell whether a run is due.
+
+        :param next_sync_at: The ISO 8601 time of the next run from the state, or None if never scheduled.
+        :param now: The current time, defaults to now in UTC.
+        :return: True if a run is due.
+        """
+        if not next_sync_at:
+            return True
+        now = now or datetime.now(timezone.utc)
+        # Allow for timers firing slightly early.
+        return now + timedelta(seconds=30) >= datetime.fromisoformat(next_sync_at)
+
+    def next_interval(self, current_interval: str, delta_count: int) -> int:
+        """
+        Compute the interval until the next run from the delta volume of the last run.
+
+        :param current_interval: The current interval in seconds from the state, or None.
+        :param delta_count: The number of delta events handled by the last run.
+        :return: The new interval in seconds.
+        """
+        interval = int(current_interval) if current_interval else self.min_interval
+        if delta_count >= self.busy_threshold:
+            interval //= 2
+        elif delta_count == 0:
+            interval *= 2
+        return max(self.min_interval, min(self.max_interval, interval))
+
+    def next_sync_at(self, interval: int, started_at: datetime = None) -> str:
+        """
+        Compute the time of the next run.
+
+        The interval is counted from the start of the run, so a run that takes longer than the
+        slack in is_due does not miss the next timer tick.
+
+        :param interval: The interval in seconds.
+        :param started_at: The time the run started, defaults to now in UTC.
+        :return: The time of the next run in ISO 8601 format.
+        """
+        started_at = started_at or datetime.now(timezone.utc)
+        return (started_at + timedelta(seconds=interval)).replace(microsecond=0).isoformat()
@@ -0,0 +1,113 @@
+import logging
+import threading
+import time
+from typing import Dict
+from gql import GraphQLRequest, gql
+from shared.gql_client import GraphQLClient
+from shared.configuration_manager import SynchronizerStateManager
+
+
+# Entity name -> name of its deltas field in the Xledger API, filled in by the entity modules.
+REGISTERED_ENTITIES: Dict[str, str] = {}
+
+_probe_lock = threading.Lock()
+_probe_cache = {"time": 0.0, "result": {}}
+
+
+def register_entity(name: str, delta_field: str) -> None:
+    """
+    Register an entity to be included in the multiplexed change probe.
+
+    :param name: The entity name, also used as the prefix of its state.
+    :param delta_field: The name of the entity's deltas field, e.g. 'timesheet_deltas'.
+    """
+    REGISTERED_ENTITIES[name] = delta_field
+
+
+class ChangeProbe:
+    """
+    Checks whether several entities have new deltas using a single GraphQL request.
+
+    Each entity becomes an aliased `first: 1, after: <cursor>` selection on its deltas field,
+    so the request only returns at most one edge per entity.
+    """
+
+    def __init__(self, client: GraphQLClient, entities: Dict[str, str]) -> None:
+        """
+        Initialize the ChangeProbe.
+
+        :param client: The GraphQL client used for the probe.
+        :param entities: Entity names mapped to their deltas field.
+        """
+        self.graphql_client = client
+        self.entities = dict(entities)
+        self.query = self._build_query()
+
+    def _build_query(self) -> GraphQLRequest:
+        variables = ", ".join(f"$after_{name}: String" for name in self.entities)
+        selections = "\n".join(
+            f"{name}: {field}(first: 1, after: $after_{name}) {{ edges {{ cursor }} }}"
+            for name, field in self.entities.items()
+        )
+        return gql(f"query probeChanges({variables}) {{\n{selections}\n}}")
+
+    def probe(self, cursors: Dict[str, str]) -> Dict[str, bool]:
+        """
+        Probe all entities for deltas after their cursors.
+
+        :param cursors: Entity names mapped to their current deltas cursor.
+        :return: Entity names mapped to whether they have new deltas.
+        """
+        variables = {f"after_{name}": cursors.get(name) for name in self.entities}
+        result = self.graphql_client.execute_graphql_query(self.query, variables)
+        return {name: bool((result.get(name) or {}).get('edges')) for name in self.entities}
+
+
+def has_pending_changes(name: str, api_endpoint: str, api_key: str, state_manager_connection_string: str,
+                        max_age: int = 300) -> bool:
+    """
+    Tell whether an entity has deltas to syncronize, probing all registered entities at once.
+
+    The timers of all entities fire together, so the first one to ask probes every registered entity
+    and the others reuse that result for `max_age` seconds. Entities that have not completed their
+    initial sync, and entities that are not registered, are always reported as having changes.
+
+    :param name: The entity name.
+    :param api_endpoint: The endpoint URL of the GraphQL API.
+    :param api_key: The API key for authentication.
+    :param state_manager_connection_string: Connection string for the state in Azure App Configuration.
+    :param max_age: Seconds a probe result is reused.
+    :return: True if a syncronization should run for the entity.
+    """
+    if name not in REGISTERED_ENTITIES:
+        return True
+
+    with _probe_lock:
+        if time.monotonic() - _probe_cache["time"] > max_age or name not in _probe_cache["result"]:
+            _probe_cache["result"] = _probe_all(api_endpoint, api_key, state_manager_connection_string)
+            _probe_cache["time"] = time.monotonic()
+        return _probe_cache["result"][name]
+
+
+def _probe_all(api_endpoint: str, api_key: str, state_manager_connection_string: str) -> Dict[str, bool]:
+    result = {}
+    cursors = {}
+    for name in REGISTERED_ENTITIES:
+        state_manager = SynchronizerStateManager(state_manager_connection_string, f"{name}-")
+        cursor = state_manager.deltas_cursor if state_manager.initial_sync_complete else None
+        if cursor is None:
+            result[name] = True
+        else:
+            cursors[name] = cursor
+
+    if cursors:
+        entities = {name: REGISTERED_ENTITIES[name] for name in cursors}
+        try:
+            result.update(ChangeProbe(GraphQLClient(api_endpoint, api_key), entities).probe(cursors))
+        except Exception as e:
+            # Never let a failing probe stop the syncronizations.
+            logging.error(f"Change probe failed, syncronizing all entities: {e}")
+            result.update({name: True for name in cursors})
+
+    logging.info(f"Change probe result: {result}")
+    return result
@@ -1,42 +1,107 @@
+import json
 import logging
 from azure.appconfiguration import AzureAppConfigurationClient
 from azure.appconfiguration import ConfigurationSetting
-from azure.core.exceptions import ResourceNotFoundError, AzureError
+from azure.appconfiguration.aio import AzureAppConfigurationClient as AsyncAzureAppConfigurationClient
+from azure.core import MatchConditions
+from azure.core.exceptions import ResourceNotFoundError, ResourceNotModifiedError, AzureError
+from shared.utils.time import generate_iso_8601_timestamp
 
 
 class ConfigurationManager:
-    def __init__(self, connection_string: str, prefix: str = ''):
+    """
+    Caches the settings under a key prefix in Azure App Configuration.
+
+    Only keys under the prefix (and label, if given) are listed, filtered by the server. Settings that
+    are assigned are tracked as dirty, and `save` writes only those. With a sentinel key, `refresh`
+    reloads the cache only when the sentinel's ETag has changed, and `save` touches the sentinel so
+    other readers pick up the change.
+    """
+
+    _own_attributes = ['client', 'settings', 'prefix', 'label', 'sentinel_key', '_dirty', '_sentinel_etag']
+
+    def __init__(self, connection_string: str, prefix: str = '', label: str = None, sentinel_key: str = None):
         self.client = AzureAppConfigurationClient.from_connection_string(connection_string)
         self.settings = {}
         self.prefix = prefix
+        self.label = label
+        self.sentinel_key = sentinel_key
+        self._dirty = set()
+        self._sentinel_etag = None
 
     def load(self):
         try:
-            fetched_kv = self.client.list_configuration_settings()
-            self.settings = {item.key[len(self.prefix):]: item.value
-                             for item in fetched_kv if item.key.startswith(self.prefix)}
+            # The sentinel is read first, so a write made while listing is picked up by the next refresh.
+            sentinel_etag = self._get_sentinel_etag()
+            fetched_kv = self.client.list_configuration_settings(key_filter=f"{self.prefix}*", label_filter=self.label)
+            self.settings = {item.key[len(self.prefix):]: item.value for item in fetched_kv}
+            self._dirty.clear()
+            self._sentinel_etag = sentinel_etag
             logging.info("Configuration loaded successfully.")
         except Exception as e:
             logging.error(f"Failed to load configuration: {e}")
 
+    def refresh(self) -> bool:
+        """
+        Reload the settings if the sentinel key changed since the last load.
+
+        :return: True if the settings were reloaded.
+        """
+        if not self.sentinel_key:
+            self.load()
+            return True
+
+        try:
+            sentinel = self.client.get_configuration_setting(key=self.sentinel_key, label=self.label, etag=self._sentinel_etag,
+                                                             match_condition=MatchConditions.IfModified)
+            # Depending on the SDK version an unmodified setting is returned as None or raised.
+            if sentinel is None:
+                return False
+        except ResourceNotModifiedError:
+            return False
+        except ResourceNotFoundError:
+            if self._sentinel_etag is None:
+                return False
+
+        self.load()
+        return True
+
     def save(self):
+        if not self._dirty:
+            return
+
         try:
-            for key, value in self.settings.items():
-                self.client.set_configuration_setting(ConfigurationSetting(key=self.prefix + key, value=value))
+            for key in list(self._dirty):
+                self.client.set_configuration_setting(ConfigurationSetting(key=self.prefix + key, value=self.settings[key], label=self.label))
+                self._dirty.discard(key)
+            if self.sentinel_key:
+                # Keep the ETag of our own write, reading it again could pick up the write of another instance.
+                sentinel = self.client.set_configuration_setting(ConfigurationSetting(key=self.sentinel_key, value=generate_iso_8601_timestamp(), label=self.label))
+                self._sentinel_etag = sentinel.etag
             logging.info("Configuration saved successfully.")
         except Exception as e:
             logging.error(f"Failed to save configuration: {e}")
 
+    def _get_sentinel_etag(self):
+        if not self.sentinel_key:
+            return None
+        try:
+            return self.client.get_configuration_setting(key=self.sentinel_key, label=self.label).etag
+        except ResourceNotFoundError:
+            return None
+
     def __getattr__(self, name):
-        if name in ['client', 'settings', 'prefix']:
+        if name in self._own_attributes:
             return super().__getattr__(name)
         return self.settings.get(name, None)
 
     def __setattr__(self, name, value):
-        if name in ['client', 'settings', 'prefix']:
+        if name in self._own_attributes:
             super().__setattr__(name, value)
         else:
-            self.settings[name] = value
+            if self.settings.get(name) != value:
+                self.settings[name] = value
+                self._dirty.add(name)
             logging.info(f"Setting updated - {name}: {value}")
 
 
@@ -112,6 +177,25 @@ class SynchronizerStateManager:
         """
         self._save_state('deltas_cursor', cursor)
 
+    @property
+    def indexes_cursor(self) -> str:
+        """
+        Get the deltas cursor the saved indexes may hold changes up to. It is ahead of the deltas
+        cursor when a window saved its indexes but not its cursor.
+
+        :return: The cursor, or None if not set.
+        """
+        return self._get_state('indexes_cursor')
+
+    @indexes_cursor.setter
+    def indexes_cursor(self, cursor: str):
+        """
+        Set the deltas cursor the saved indexes may hold changes up to.
+
+        :param cursor: The cursor.
+        """
+        self._save_state('indexes_cursor', cursor)
+
     @property
     def initial_sync_complete(self) -> bool:
         """
@@ -147,3 +231,218 @@ class SynchronizerStateManager:
         :param cursor: The new value for the initial synchronization cursor.
         """
         self._save_state('initial_sync_cursor', cursor)
+
+    @property
+    def sync_interval(self) -> str:
+        """
+        Get the adaptive synchronization interval in seconds.
+
+        :return: The current interval, or None if not set.
+        """
+        return self._get_state('sync_interval')
+
+    @sync_interval.setter
+    def sync_interval(self, seconds: int):
+        """
+        Set the adaptive synchronization interval.
+
+        :param seconds: The new interval in seconds.
+        """
+        self._save_state('sync_interval', str(seconds))
+
+    @property
+    def next_sync_at(self) -> str:
+        """
+        Get the time the next synchronization is due.
+
+        :return: The time in ISO 8601 format, or None if not set.
+        """
+        return self._get_state('next_sync_at')
+
+    @next_sync_at.setter
+    def next_sync_at(self, timestamp: str):
+        """
+        Set the time the next synchronization is due.
+
+        :param timestamp: The time in ISO 8601 format.
+        """
+        self._save_state('next_sync_at', timestamp)
+
+    @property
+    def pending_batch(self) -> str:
+        """
+        Get the id of the distributed batch whose chunks are still being processed.
+
+        :return: The batch id, or None or an empty string if no batch is pending.
+        """
+        return self._get_state('pending_batch')
+
+    @pending_batch.setter
+    def pending_batch(self, batch_id: str):
+        """
+        Set the id of the pending distributed batch.
+
+        :param batch_id: The batch id, or an empty string when the batch is complete.
+        """
+        self._save_state('pending_batch', batch_id)
+
+    @property
+    def pending_batch_at(self) -> str:
+        """
+        Get the time the pending distributed batch was dispatched.
+
+        :return: The time in ISO 8601 format, or None if it was never set.
+        """
+        return self._get_state('pending_batch_at')
+
+    @pending_batch_at.setter
+    def pending_batch_at(self, timestamp: str):
+        """
+        Set the time the pending distributed batch was dispatched.
+
+        :param timestamp: The time in ISO 8601 format.
+        """
+        self._save_state('pending_batch_at', timestamp)
+
+    @property
+    def last_run_started_at(self) -> str:
+        """
+        Get the start time of the last completed synchronization.
+
+        :return: The time in ISO 8601 format, or None if no run has completed.
+        """
+        return self._get_state('last_run_started_at')
+
+    @last_run_started_at.setter
+    def last_run_started_at(self, timestamp: str):
+        """
+        Set the start time of the last completed synchronization.
+
+        :param timestamp: The time in ISO 8601 format.
+        """
+        self._save_state('last_run_started_at', timestamp)
+
+    @property
+    def last_run_metrics(self) -> dict:
+        """
+        Get the freshness metrics of the last completed synchronization. Earlier values are kept in
+        the revision history of the key.
+
+        :return: The metrics, or None if no run has completed.
+        """
+        value = self._get_state('last_run_metrics')
+        return json.loads(value) if value else None
+
+    @last_run_metrics.setter
+    def last_run_metrics(self, metrics: dict):
+        """
+        Set the freshness metrics of the last completed synchronization.
+
+        :param metrics: The metrics.
+        """
+        self._save_state('last_run_metrics', json.dumps(metrics))
+
+
+class AsyncSynchronizerStateManager:
+    """
+    Manages the synchronizer state using the asynchronous Azure App Configuration client.
+
+    Holds the same state as SynchronizerStateManager, but since properties cannot be awaited the
+    state is read and written through coroutine methods. Use it as an async context manager.
+    """
+
+    def __init__(self, connection_string: str, prefix: str = ''):
+        """
+        Initialize the AsyncSynchronizerStateManager.
+
+        :param connection_string: Connection string for Azure App Configuration.
+        :param prefix: Optional prefix for filtering configuration keys.
+        """
+        self._client = AsyncAzureAppConfigurationClient.from_connection_string(connection_string)
+        self._prefix = prefix
+
+    async def _get_state(self, key: str):
+        """
+        Fetch the current value for the specified key from Azure App Configuration.
+
+        :param key: The key of the configuration setting.
+        :return: The value of the configuration setting, or None if the key does not exist.
+        """
+        try:
+            setting = await self._client.get_configuration_setting(key=f"{self._prefix}{key}")
+            logging.info(f"Fetched state: {key} = {setting.value}")
+            return setting.value
+        except ResourceNotFoundError:
+            logging.warning(f"State key not found: {key}")
+            return None
+        except AzureError as e:
+            logging.error(f"Error fetching state {key}: {e}")
+            raise
+
+    async def _save_state(self, key: str, value: str):
+        """
+        Save the value for the specified key to Azure App Configuration.
+
+        :param key: The key of the configuration setting.
+        :param value: The value to be saved.
+        """
+        try:
+            config_setting = ConfigurationSetting(key=f"{self._prefix}{key}", value=value)
+            await self._client.set_configuration_setting(config_setting)
+            logging.info(f"Saved state: {key} = {value}")
+        except AzureError as e:
+            logging.error(f"Error saving state {key}: {e}")
+            raise
+
+    async def get_deltas_cursor(self) -> str:
+        return await self._get_state('deltas_cursor')
+
+    async def set_deltas_cursor(self, cursor: str) -> None:
+        await self._save_state('deltas_cursor', cursor)
+
+    async def get_initial_sync_complete(self) -> bool:
+        return await self._get_state('initial_sync_complete') == 'true'
+
+    async def set_initial_sync_complete(self, completes: bool) -> None:
+        await self._save_state('initial_sync_complete', 'true' if completes else 'false')
+
+    async def get_initial_sync_cursor(self) -> str:
+        return await self._get_state('initial_sync_cursor')
+
+    async def set_initial_sync_cursor(self, cursor: str) -> None:
+        await self._save_state('initial_sync_cursor', cursor)
+
+    async def get_sync_interval(self) -> str:
+        return await self._get_state('sync_interval')
+
+    async def set_sync_interval(self, seconds: int) -> None:
+        await self._save_state('sync_interval', str(seconds))
+
+    async def get_next_sync_at(self) -> str:
+        return await self._get_state('next_sync_at')
+
+    async def set_next_sync_at(self, timestamp: str) -> None:
+        await self._save_state('next_sync_at', timestamp)
+
+    async def get_last_run_started_at(self) -> str:
+        return await self._get_state('last_run_started_at')
+
+    async def set_last_run_started_at(self, timestamp: str) -> None:
+        await self._save_state('last_run_started_at', timestamp)
+
+    async def get_last_run_metrics(self) -> dict:
+        value = await self._get_state('last_run_metrics')
+        return json.loads(value) if value else None
+
+    async def set_last_run_metrics(self, metrics: dict) -> None:
+        await self._save_state('last_run_metrics', json.dumps(metrics))
+
+    async def close(self) -> None:
+        """Close the underlying App Configuration client."""
+        await self._client.close()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc_value, traceback):
+        await self.close()
@@ -0,0 +1,109 @@
+import hashlib
+import json
+import logging
+from io import BytesIO
+from typing import Any, Dict, Iterable, List
+import pyarrow as pa
+import pyarrow.parquet as pq
+from shared.data_lake_writer import DataLakeWriter
+
+
+class ContentHashIndex:
+    """
+    Keeps a hash of the selected fields of every item written to the data lake.
+
+    The index maps dbId to a 64-bit hash of the item as returned by the items query. It is used
+    to drop UPDATED items whose selected fields did not change, since Xledger also emits deltas
+    for changes to fields the queries do not select. The index is persisted as a Parquet file
+    in a `_state` directory next to the entity's output, which dataset readers ignore.
+    """
+
+    def __init__(self, data_lake_writer: DataLakeWriter, file_system_name: str, directory_name: str,
+                 file_name: str = "content_hashes.parquet") -> None:
+        """
+        Initialize the ContentHashIndex.
+
+        :param data_lake_writer: Writer used to load and persist the index.
+        :param file_system_name: Name of the file system (container) holding the index.
+        :param directory_name: Name of the directory holding the index.
+        :param file_name: Name of the index file.
+        """
+        self.data_lake_writer = data_lake_writer
+        self.file_system_name = file_system_name
+        self.directory_name = directory_name
+        self.file_name = file_name
+        self.hashes: Dict[int, int] = {}
+
+    @staticmethod
+    def hash_item(item: Dict[str, Any]) -> int:
+        """
+        Compute a stable 64-bit hash of an item.
+
+        :param item: The item as returned by the items query.
+        :return: The hash as a signed 64-bit integer.
+        """
+        serialized = json.dumps(item, sort_keys=True, separators=(',', ':'), default=str)
+        digest = hashlib.blake2b(serialized.encode('utf-8'), digest_size=8).digest()
+        return int.from_bytes(digest, 'little', signed=True)
+
+    def load(self) -> None:
+        """
+        Load the index from the data lake. A missing index file results in an empty index.
+        """
+        data = self.data_lake_writer.read_data(self.file_system_name, self.directory_name, self.file_name)
+        if data is None:
+            self.hashes = {}
+            return
+
+        table = pq.read_table(BytesIO(data))
+        self.hashes = dict(zip(table.column('dbId').to_pylist(), table.column('hash').to_pylist()))
+        logging.info(f"Loaded {len(self.hashes)} content hashes from '{self.directory_name}/{self.file_name}'.")
+
+    def save(self) -> None:
+        """
+        Persist the index to the data lake, replacing the previous version.
+        """
+        table = pa.table({
+            'dbId': pa.array(list(self.hashes.keys()), type=pa.int64()),
+            'hash': pa.array(list(self.hashes.values()), type=pa.int64())
+        })
+        buf = BytesIO()
+        pq.write_table(table, buf)
+        self.data_lake_writer.write_data(self.file_system_name, self.directory_name, self.file_name, buf)
+
+    def update(self, items: Iterable[Dict[str, Any]]) -> None:
+        """
+        Record the hashes of the given items.
+
+        :param items: Items as returned by the items query.
+        """
+        for item in items:
+            self.hashes[int(item['dbId'])] = self.hash_item(item)
+
+    def filter_changed(self, items: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """
+        Return the items whose hash differs from the recorded one and record their new hashes.
+
+        :param items: Items as returned by the items query.
+        :return: The items that changed or are not in the index.
+        """
+        changed = []
+        for item in items:
+            db_id = int(item['dbId'])
+            item_hash = self.hash_item(item)
+            if self.hashes.get(db_id) != item_hash:
+                self.hashes[db_id] = item_hash
+                changed.append(item)
+
+        if len(changed) < len(items):
+            logging.info(f"Suppressed {len(items) - len(changed)} unchanged items.")
+        return changed
+
+    def remove(self, db_ids: Iterable[Any]) -> None:
+        """
+        Remove the given dbIds from the index.
+
+        :param db_ids: The dbIds to remove.
+        """
+        for db_id in db_ids:
+            self.hashes.pop(int(db_id), None)
@@ -1,7 +1,10 @@
 import logging
 from io import BytesIO
+from typing import Iterable
 from azure.storage.filedatalake import DataLakeServiceClient, DataLakeFileClient
-from azure.core.exceptions import ResourceExistsError, HttpResponseError
+from azure.storage.filedatalake.aio import DataLakeServiceClient as AsyncDataLakeServiceClient
+from azure.core import MatchConditions
+from azure.core.exceptions import ResourceExistsError, ResourceNotFoundError, HttpResponseError
 
 
 class DataLakeWriter:
@@ -142,4 +145,281 @@ class DataLakeWriter:
         # Write data to the file.
         self._write_to_file(file_client, bytes_data)
 
-        logging.info(f"Data written to '{file_system_name}/{directory_name}/{file_name}' successfully.")
\ No newline at end of file
+        logging.info(f"Data written to '{file_system_name}/{directory_name}/{file_name}' successfully.")
+
+    def write_chunks(self, file_system_name: str, directory_name: str, file_name: str, chunks: Iterable[bytes]) -> int:
+        """
+        Write a file from an iterable of byte chunks, appending each chunk as it is produced.
+
+        Only one chunk is held in memory at a time, which suits streamed output such as
+        `stream_dicts_to_csv`. The file is committed once the last chunk has been appended.
+
+        :param file_system_name: Name of the file system (container)
+        :param directory_name: Name of the directory
+        :param file_name: Name of the file
+        :param chunks: The content of the file in chunks
+        :return: The size of the file in bytes
+        """
+        self._ensure_file_system_exists(file_system_name)
+        file_system_client = self._get_file_system_client(file_system_name)
+        self._ensure_directory_exists(file_system_client, directory_name)
+        file_client = self._get_file_client(file_system_client, directory_name, file_name)
+
+        offset = 0
+        try:
+            for chunk in chunks:
+                if not chunk:
+                    continue
+                file_client.append_data(chunk, offset=offset, length=len(chunk))
+                offset += len(chunk)
+            file_client.flush_data(offset)
+        except HttpResponseError as e:
+            logging.error(f"Failed to write data to file '{file_client.path_name}': {e}")
+            raise
+
+        logging.info(f"{offset} bytes written to '{file_system_name}/{directory_name}/{file_name}' successfully.")
+        return offset
+
+    def read_data(self, file_system_name: str, directory_name: str, file_name: str) -> bytes:
+        """
+        Read a file from Azure Data Lake Storage.
+
+        :param file_system_name: Name of the file system (container)
+        :param directory_name: Name of the directory
+        :param file_name: Name of the file
+        :return: The file contents, or None if the file does not exist.
+        """
+        file_system_client = self._get_file_system_client(file_system_name)
+        file_client = file_system_client.get_directory_client(directory_name).get_file_client(file_name)
+        try:
+            data = file_client.download_file().readall()
+            logging.info(f"Data read from '{file_system_name}/{directory_name}/{file_name}' successfully.")
+            return data
+        except ResourceNotFoundError:
+            logging.info(f"File '{file_name}' does not exist in '{directory_name}'.")
+            return None
+        except HttpResponseError as e:
+            logging.error(f"Failed to read file '{file_name}' in '{directory_name}': {e}")
+            raise
+
+    def ensure_file_exists(self, file_system_name: str, directory_name: str, file_name: str) -> DataLakeFileClient:
+        """
+        Create an empty file if it does not exist, without touching an existing file.
+
+        :param file_system_name: Name of the file system (container)
+        :param directory_name: Name of the directory
+        :param file_name: Name of the file
+        :return: File client
+        """
+        self._ensure_file_system_exists(file_system_name)
+        file_system_client = self._get_file_system_client(file_system_name)
+        self._ensure_directory_exists(file_system_client, directory_name)
+
+        file_client = file_system_client.get_directory_client(directory_name).get_file_client(file_name)
+        try:
+            file_client.create_file(match_condition=MatchConditions.IfMissing)
+            logging.info(f"File '{file_name}' created in '{directory_name}'.")
+        except ResourceExistsError:
+            pass
+        except HttpResponseError as e:
+            if e.status_code not in (409, 412):  # File already exists or is leased
+                logging.error(f"Failed to create file '{file_name}': {e}")
+                raise
+        return file_client
+
+    def list_files(self, file_system_name: str, directory_name: str) -> list:
+        """
+        List the names of the files directly in a directory.
+
+        :param file_system_name: Name of the file system (container)
+        :param directory_name: Name of the directory
+        :return: The file names, empty if the directory does not exist.
+        """
+        file_system_client = self._get_file_system_client(file_system_name)
+        try:
+            paths = file_system_client.get_paths(path=directory_name, recursive=False)
+            return [path.name.rsplit('/', 1)[-1] for path in paths if not path.is_directory]
+        except ResourceNotFoundError:
+            return []
+
+    def delete_file(self, file_system_name: str, directory_name: str, file_name: str) -> None:
+        """
+        Delete a file, if it exists.
+
+        :param file_system_name: Name of the file system (container)
+        :param directory_name: Name of the directory
+        :param file_name: Name of the file
+        """
+        file_system_client = self._get_file_system_client(file_system_name)
+        try:
+            file_system_client.get_directory_client(directory_name).get_file_client(file_name).delete_file()
+            logging.info(f"File '{file_name}' deleted from '{directory_name}'.")
+        except ResourceNotFoundError:
+            pass
+
+    def delete_directory(self, file_system_name: str, directory_name: str) -> None:
+        """
+        Delete a directory and everything in it, if it exists.
+
+        :param file_system_name: Name of the file system (container)
+        :param directory_name: Name of the directory
+        """
+        file_system_client = self._get_file_system_client(file_system_name)
+        try:
+            file_system_client.get_directory_client(directory_name).delete_directory()
+            logging.info(f"Directory '{directory_name}' deleted.")
+        except ResourceNotFoundError:
+            pass
+
+
+class AsyncDataLakeWriter:
+    """
+    Handles writing data to Azure Data Lake Storage with the asynchronous SDK client.
+
+    File systems and directories are only ensured once per writer, and files are uploaded with
+    `upload_data`, which splits large payloads into chunks. Use it as an async context manager.
+    """
+
+    def __init__(self, account_name: str, account_key: str):
+        """
+        Initialize the AsyncDataLakeWriter with the storage account credentials.
+
+        :param account_name: Azure storage account name
+        :param account_key: Azure storage account key
+        """
+        self.service_client = AsyncDataLakeServiceClient(
+            account_url=f"https://{account_name}.dfs.core.windows.net",
+            credential=account_key
+        )
+        self._ensured_paths = set()
+
+    async def _ensure_file_system_exists(self, file_system_name: str) -> None:
+        """
+        Ensure that the specified file system exists. Create it if it does not exist.
+
+        :param file_system_name: Name of the file system (container)
+        """
+        if file_system_name in self._ensured_paths:
+            return
+
+        file_system_client = self.service_client.get_file_system_client(file_system_name)
+        try:
+            await file_system_client.create_file_system()
+            logging.info(f"File system '{file_system_name}' created successfully.")
+        except ResourceExistsError:
+            logging.info(f"File system '{file_system_name}' already exists.")
+        except HttpResponseError as e:
+            logging.error(f"Failed to create or access file system '{file_system_name}': {e}")
+            raise
+        self._ensured_paths.add(file_system_name)
+
+    async def _ensure_directory_exists(self, file_system_client, directory_name: str) -> None:
+        """
+        Ensure that the specified directory exists. Create it if it does not exist.
+
+        :param file_system_client: Client for the file system
+        :param directory_name: Name of the directory
+        """
+        current_path = ''
+        for dir_name in directory_name.strip('/').split('/'):
+            current_path = f"{current_path}/{dir_name}" if current_path else dir_name
+            key = f"{file_system_client.file_system_name}/{current_path}"
+            if key in self._ensured_paths:
+                continue
+            try:
+                await file_system_client.create_directory(current_path)
+                logging.info(f"Directory '{current_path}' created.")
+            except HttpResponseError as e:
+                if e.status_code == 409:  # Directory already exists
+                    logging.info(f"Directory '{current_path}' already exists.")
+                else:
+                    logging.error(f"Failed to create directory '{current_path}': {e}")
+                    raise
+            self._ensured_paths.add(key)
+
+    async def write_data(self, file_system_name: str, directory_name: str, file_name: str, data) -> None:
+        """
+        Write data to a file in Azure Data Lake Storage, replacing any existing file.
+
+        :param file_system_name: Name of the file system (container)
+        :param directory_name: Name of the directory
+        :param file_name: Name of the file
+        :param data: Data to write to the file, can be a string or BytesIO object
+        """
+        await self._ensure_file_system_exists(file_system_name)
+        file_system_client = self.service_client.get_file_system_client(file_system_name)
+        await self._ensure_directory_exists(file_system_client, directory_name)
+
+        # Handle BytesIO data
+        if isinstance(data, BytesIO):
+            data.seek(0)
+            bytes_data = data.getvalue()
+        elif isinstance(data, str):
+            bytes_data = data.encode('utf-8')
+        else:
+            raise ValueError("Data must be a string or BytesIO object.")
+
+        file_client = file_system_client.get_directory_client(directory_name).get_file_client(file_name)
+        try:
+            await file_client.upload_data(bytes_data, overwrite=True)
+        except HttpResponseError as e:
+            logging.error(f"Failed to write data to file '{file_name}': {e}")
+            raise
+
+        logging.info(f"Data written to '{file_system_name}/{directory_name}/{file_name}' successfully.")
+
+    async def read_data(self, file_system_name: str, directory_name: str, file_name: str) -> bytes:
+        """
+        Read a file from Azure Data Lake Storage.
+
+        :param file_system_name: Name of the file system (container)
+        :param directory_name: Name of the directory
+        :param file_name: Name of the file
+        :return: The file contents, or None if the file does not exist.
+        """
+        file_system_client = self.service_client.get_file_system_client(file_system_name)
+        file_client = file_system_client.get_directory_client(directory_name).get_file_client(file_name)
+        try:
+            downloader = await file_client.download_file()
+            return await downloader.readall()
+        except ResourceNotFoundError:
+            logging.info(f"File '{file_name}' does not exist in '{directory_name}'.")
+            return None
+        except HttpResponseError as e:
+            logging.error(f"Failed to read file '{file_name}' in '{directory_name}': {e}")
+            raise
+
+    async def ensure_file_exists(self, file_system_name: str, directory_name: str, file_name: str):
+        """
+        Create an empty file if it does not exist, without touching an existing file.
+
+        :param file_system_name: Name of the file system (container)
+        :param directory_name: Name of the directory
+        :param file_name: Name of the file
+        :return: Async file client
+        """
+        await self._ensure_file_system_exists(file_system_name)
+        file_system_client = self.service_client.get_file_system_client(file_system_name)
+        await self._ensure_directory_exists(file_system_client, directory_name)
+
+        file_client = file_system_client.get_directory_client(directory_name).get_file_client(file_name)
+        try:
+            await file_client.create_file(match_condition=MatchConditions.IfMissing)
+            logging.info(f"File '{file_name}' created in '{directory_name}'.")
+        except ResourceExistsError:
+            pass
+        except HttpResponseError as e:
+            if e.status_code not in (409, 412):  # File already exists or is leased
+                logging.error(f"Failed to create file '{file_name}': {e}")
+                raise
+        return file_client
+
+    async def close(self) -> None:
+        """Close the underlying service client."""
+        await self.service_client.close()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc_value, traceback):
+        await self.close()
\ No newline at end of file
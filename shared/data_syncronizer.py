@@ -1,85 +1,758 @@
 from typing import List, Dict, Any
+import asyncio
+import hashlib
+import json
 import logging
-from shared.delta_fetcher import DeltaFetcher
-from shared.item_fetcher import ItemFetcher
-from shared.data_lake_writer import DataLakeWriter
-from shared.configuration_manager import SynchronizerStateManager
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+import pyarrow as pa
+from shared.delta_fetcher import DeltaFetcher, AsyncDeltaFetcher, DeltasResult
+from shared.item_fetcher import ItemFetcher, AsyncItemFetcher, ItemsResult, MAX_FAILED_IDS
+from shared.data_lake_writer import DataLakeWriter, AsyncDataLakeWriter
+from shared.configuration_manager import SynchronizerStateManager, AsyncSynchronizerStateManager
+from shared.content_hash_index import ContentHashIndex
+from shared.dbid_index import DbIdIndex
+from shared.lease_manager import DataLakeLease, AsyncDataLakeLease
+from shared.rollups import IncrementalRollup
+from shared.profiling import RunProfiler
+from shared.sync_metrics import RunMetrics, LoggingMetricsSink
+from shared.work_queue import StorageWorkQueue
+from shared.utils.files import WRITTEN_AT_KEY, convert_dicts_to_table, convert_tables_to_parquet, stream_dicts_to_csv
 from shared.utils.data_transformation import flatten_list_of_dicts
-from shared.utils.files import convert_dicts_to_parquet
 from shared.utils.time import get_current_time_for_filename
 
 
+def _deletions_table(db_ids: List[Any]) -> pa.Table:
+    return convert_dicts_to_table([{"dbId": dbId} for dbId in db_ids], {"mutationType": "DELETED"})
+
+
+def _encode_change_file(tables: List[pa.Table], sort_key: str = None):
+    # Stamped with the write time, which orders change files for readers, see LakeReader.
+    return convert_tables_to_parquet(tables, sort_key, {WRITTEN_AT_KEY: time.time_ns()})
+
+
+def _file_key(*parts: Any) -> str:
+    # Short stable digest, cursors are opaque and not safe to use in file names as they are.
+    return hashlib.blake2b("|".join(str(part) for part in parts).encode("utf-8"), digest_size=8).hexdigest()
+
+
+def window_file_name(name: str, after_cursor: str) -> str:
+    """
+    Name of the file holding the changes after a deltas cursor.
+
+    The name only depends on the entity and the cursor the window starts after, so a window that is
+    retried, because its cursor was not saved, overwrites its own file instead of adding a duplicate.
+
+    :param name: Name of the entity.
+    :param after_cursor: The deltas cursor the window starts after.
+    :return: The file name.
+    """
+    return f"{name}-after-{_file_key(after_cursor)}.parquet"
+
+
+# Dead-lettered dbIds are kept as small JSON files in `<entity>/_state/dead_letters/`.
+DEAD_LETTER_DIRECTORY = "_state/dead_letters"
+# At most this many dead-lettered dbIds are retried per run.
+MAX_DEAD_LETTER_IDS = 10000
+# dbIds that still fail after this many retries are dropped from the dead letters.
+MAX_DEAD_LETTER_ATTEMPTS = 7
+_RETRIED_DEAD_LETTERS = "retried.json"
+
+
+def _failed_ids(results: List[ItemsResult]) -> List[int]:
+    return sorted({int(db_id) for result in results for db_id in result.get_failed_ids()})
+
+
+def _dead_letter_file_name(failed_ids: List[int]) -> str:
+    # Named after its dbIds, so a retried window rewrites its own file.
+    return f"{_file_key(failed_ids)}.json"
+
+
 class DataSynchronizer:
     def __init__(self, 
                  name: str, 
                  delta_fetcher: DeltaFetcher, 
                  item_fetcher: ItemFetcher,
                  data_lake_writer: DataLakeWriter,
-                 state_manager: SynchronizerStateManager = None) -> None:
+                 state_manager: SynchronizerStateManager = None,
+                 delta_window_size: int = None,
+                 content_hash_index: ContentHashIndex = None,
+                 dbid_index: DbIdIndex = None,
+                 explode_lists: bool = True,
+                 rollups: List[IncrementalRollup] = None,
+                 sort_key: str = None,
+                 profiler: RunProfiler = None,
+                 metrics_sink: LoggingMetricsSink = None,
+                 lease: DataLakeLease = None) -> None:
         self.name = name
         self.delta_fetcher = delta_fetcher
         self.item_fetcher = item_fetcher
         self.state_manager = state_manager
         self.data_lake_writer = data_lake_writer
+        self.delta_window_size = delta_window_size
+        self.content_hash_index = content_hash_index
+        self.dbid_index = dbid_index
+        self.explode_lists = explode_lists
+        self.rollups = rollups or []
+        self.sort_key = sort_key
+        self.profiler = profiler or RunProfiler(name)
+        self.metrics_sink = metrics_sink or LoggingMetricsSink()
+        self.lease = lease
+        self.metrics = RunMetrics(name)
+        self.delta_count = 0
+
+    def _ensure_lease(self) -> None:
+        # Stop before writing when the lease of the entity was lost to another instance.
+        if self.lease is not None:
+            self.lease.ensure_held()
 
     def syncronize(self, sync_from_scratch: bool) -> None:
-        if sync_from_scratch:
-            self._full_syncronization()
-        else:
-            self._syncronize_changes()
+        self.delta_count = 0
+        self.metrics = RunMetrics(self.name, self.state_manager.last_run_started_at)
+        with self.profiler:
+            with self.profiler.stage("load_indexes"):
+                if self.content_hash_index:
+                    self.content_hash_index.load()
+                if self.dbid_index is not None:
+                    self.dbid_index.load()
+                for rollup in self.rollups:
+                    rollup.load()
+
+            if sync_from_scratch:
+                self._full_syncronization()
+            else:
+                self._syncronize_changes()
+
+        # Only completed runs are recorded.
+        self._record_run()
+
+    def _record_run(self) -> None:
+        metrics = self.metrics.finish()
+        self._ensure_lease()
+        self.state_manager.last_run_started_at = metrics["started_at"]
+        self.state_manager.last_run_metrics = metrics
+        self.metrics_sink.emit(metrics)
 
     def _full_syncronization(self) -> None:
         # Get the last delta.
-        deltas = self.delta_fetcher.fetch_deltas({"last": 1})
+        with self.profiler.stage("fetch_deltas"):
+            deltas = self.delta_fetcher.fetch_deltas({"last": 1})
         
         # Fetch all items.
-        items = self.item_fetcher.fetch_all_items_after_cursor(first=10000)
+        with self.profiler.stage("fetch_items"):
+            items = self.item_fetcher.fetch_all_items_after_cursor(first=10000)
         if not items.has_items():
             logging.info(f"No items found for {self.name}.")
             return
         
         # Transform items.
-        items.add_key_value_to_items("mutationType", "ADDED")
-        items_transformed = convert_dicts_to_parquet(flatten_list_of_dicts(items.get_items()))
+        with self.profiler.stage("update_indexes"):
+            if self.content_hash_index:
+                self.content_hash_index.update(items.get_items())
+            if self.dbid_index is not None:
+                self.dbid_index.reset(item['dbId'] for item in items.get_items() if item.get('dbId') is not None)
+            for rollup in self.rollups:
+                rollup.reset()
+                rollup.apply_items(items.get_items())
+        with self.profiler.stage("encode"):
+            items.set_constant_column("mutationType", "ADDED")
+            items_transformed = _encode_change_file([items.to_table(self.explode_lists)], self.sort_key)
+        self.metrics.record_rows(len(items.get_items()))
         
         # Write items to data lake.
-        self.data_lake_writer.write_data("filesystem", self.name, f"{get_current_time_for_filename()}-{self.name}.parquet", items_transformed)
+        self._ensure_lease()
+        with self.profiler.stage("write"):
+            self.data_lake_writer.write_data("filesystem", self.name, f"{self.name}-full.parquet", items_transformed)
+        self._ensure_lease()
+        self.state_manager.indexes_cursor = deltas.last_cursor
+        with self.profiler.stage("save_indexes"):
+            if self.content_hash_index:
+                self.content_hash_index.save()
+            if self.dbid_index is not None:
+                self.dbid_index.save()
+            for rollup in self.rollups:
+                rollup.save()
 
         # Update state.
+        self._ensure_lease()
         self.state_manager.initial_sync_cursor = items.get_last_item_cursor()
         self.state_manager.initial_sync_complete = True
         self.state_manager.deltas_cursor = deltas.last_cursor
 
     def _syncronize_changes(self) -> None:
-        # Get all deltas since last sync.
-        deltas = self.delta_fetcher.fetch_deltas({"first": 10000, "after": self.state_manager.deltas_cursor})
+        # Without a window size, all deltas since last sync are handled as one window.
+        cursor = self.state_manager.deltas_cursor
+        if not self.delta_window_size:
+            with self.profiler.stage("fetch_deltas"):
+                deltas = self.delta_fetcher.fetch_deltas({"first": 10000, "after": cursor})
+            self._syncronize_delta_window(deltas, cursor)
+            return
+
+        # Process the backlog window by window, advancing the cursor after each one.
+        while True:
+            with self.profiler.stage("fetch_deltas"):
+                deltas = self.delta_fetcher.fetch_deltas(
+                    {"first": self.delta_window_size, "after": cursor},
+                    max_deltas=self.delta_window_size
+                )
+            self._syncronize_delta_window(deltas, cursor)
+            cursor = deltas.last_cursor
+            if not deltas.has_more or not deltas.has_changes():
+                break
+
+    def _syncronize_delta_window(self, deltas: DeltasResult, after_cursor: str) -> None:
+        self.delta_count += deltas.event_count or deltas.count()
+        self.metrics.record_window(deltas)
 
         # No new changes found -> return.
         if not deltas.has_changes():
             logging.info(f"No changes found for {self.name}.")
             return
         
+        # When the indexes were saved but the cursor was not, this window is a retry and the indexes
+        # already hold some of its changes. Suppressing on them would drop those changes from the file
+        # that replaces the first attempt's, so nothing is suppressed. Reapplying to the indexes is harmless.
+        suppress = self.state_manager.indexes_cursor == after_cursor
+        if not suppress:
+            logging.info(f"Indexes of {self.name} may be ahead of the deltas cursor, writing every change of the window.")
+
+        # Skip additions that are already held in the data lake, e.g. from a replayed window.
+        addition_ids = deltas.get_additions()
+        if self.dbid_index is not None and addition_ids and suppress:
+            present = self.dbid_index.contains(addition_ids)
+            addition_ids = [db_id for db_id, is_present in zip(addition_ids, present) if not is_present]
+            if len(addition_ids) < len(present):
+                logging.info(f"Skipped {len(present) - len(addition_ids)} additions already held for {self.name}.")
+
         # Get all items based from the dbids fetched with the delta_fetcher.
-        all_changed_items = []
-        if deltas.has_additions():
-            additions = self.item_fetcher.fetch_items_by_ids(deltas.get_additions())
-            additions.add_key_value_to_items("mutationType", "ADDED")
-            all_changed_items.extend(additions.get_items())
+        changed_tables = []
+        failed_results = []
+        if addition_ids:
+            with self.profiler.stage("fetch_items"):
+                additions = self.item_fetcher.fetch_items_by_ids(addition_ids)
+            failed_results.append(additions)
+            if self.content_hash_index:
+                self.content_hash_index.update(additions.get_items())
+            for rollup in self.rollups:
+                rollup.apply_items(additions.get_items())
+            additions.set_constant_column("mutationType", "ADDED")
+            changed_tables.append(additions.to_table(self.explode_lists))
 
         if deltas.has_updates():
-            updates = self.item_fetcher.fetch_items_by_ids(deltas.get_updates())
-            updates.add_key_value_to_items("mutationType", "UPDATED")
-            all_changed_items.extend(updates.get_items())
+            with self.profiler.stage("fetch_items"):
+                updates = self.item_fetcher.fetch_items_by_ids(deltas.get_updates())
+            failed_results.append(updates)
+            if self.content_hash_index and suppress:
+                # Drop updates that did not touch any of the selected fields.
+                changed = self.content_hash_index.filter_changed(updates.get_items())
+                updates = ItemsResult(changed, updates.get_last_item_cursor())
+            elif self.content_hash_index:
+                self.content_hash_index.update(updates.get_items())
+            for rollup in self.rollups:
+                rollup.apply_items(updates.get_items())
+            updates.set_constant_column("mutationType", "UPDATED")
+            changed_tables.append(updates.to_table(self.explode_lists))
 
         if deltas.has_deletions():
-            deletions = [{"dbId": dbId, "mutationType": "DELETED"} for dbId in deltas.get_deletions()]
-            all_changed_items.extend(deletions)
+            changed_tables.append(_deletions_table(deltas.get_deletions()))
+            if self.content_hash_index:
+                self.content_hash_index.remove(deltas.get_deletions())
+            for rollup in self.rollups:
+                rollup.apply_deletions(deltas.get_deletions())
+
+        # Write items to data lake, unless every change was suppressed.
+        changed_tables = [table for table in changed_tables if table.num_rows]
+        if changed_tables:
+            # Transform items.
+            with self.profiler.stage("encode"):
+                parquet = _encode_change_file(changed_tables, self.sort_key)
+
+            self._ensure_lease()
+            with self.profiler.stage("write"):
+                self.data_lake_writer.write_data("filesystem", self.name, window_file_name(self.name, after_cursor), parquet)
+            self.metrics.record_rows(sum(table.num_rows for table in changed_tables))
+        else:
+            logging.info(f"All changes for {self.name} were suppressed as unchanged.")
+
+        # Mark the indexes as ahead of the cursor before saving them, so a retry knows.
+        self._ensure_lease()
+        self.state_manager.indexes_cursor = deltas.last_cursor
+        with self.profiler.stage("save_indexes"):
+            if self.content_hash_index:
+                self.content_hash_index.save()
+            if self.dbid_index is not None:
+                # Dead-lettered additions stay out of the index, so reconciliation picks them up again.
+                failed_ids = {int(db_id) for result in failed_results for db_id in result.get_failed_ids()}
+                self.dbid_index.add([db_id for db_id in addition_ids if int(db_id) not in failed_ids])
+                self.dbid_index.remove(deltas.get_deletions())
+                self.dbid_index.save()
+            for rollup in self.rollups:
+                rollup.save()
+
+        # Update state.
+        self._ensure_lease()
+        self._dead_letter(failed_results)
+        self.state_manager.deltas_cursor = deltas.last_cursor
+
+    def _dead_letter(self, results: List[ItemsResult]) -> None:
+        failed_ids = _failed_ids(results)
+        if not failed_ids:
+            return
+        self.data_lake_writer.write_data("filesystem", f"{self.name}/{DEAD_LETTER_DIRECTORY}",
+                                         _dead_letter_file_name(failed_ids), json.dumps(failed_ids))
+        logging.warning(f"Dead-lettered dbIds of {self.name}: {failed_ids}")
+
+    def retry_dead_letters(self) -> None:
+        """
+        Fetch the dead-lettered dbIds again and write the items that can be fetched now.
+
+        Recovered items are written as UPDATED and added to the indexes and rollups. At most
+        MAX_DEAD_LETTER_IDS dbIds are retried per run, in batches of MAX_FAILED_IDS so one bad batch
+        does not hold back the rest. dbIds that still fail are kept with their number of attempts,
+        and dropped with an error once they failed MAX_DEAD_LETTER_ATTEMPTS retries.
+        """
+        directory = f"{self.name}/{DEAD_LETTER_DIRECTORY}"
+        file_names = self.data_lake_writer.list_files("filesystem", directory)
+        if not file_names:
+            return
+
+        # New dead letters are lists of dbIds, the retried ones map dbIds to their attempts.
+        attempts: Dict[int, int] = {}
+        for file_name in file_names:
+            content = json.loads(self.data_lake_writer.read_data("filesystem", directory, file_name) or "[]")
+            if isinstance(content, dict):
+                attempts.update({int(db_id): count for db_id, count in content.items()})
+            else:
+                for db_id in content:
+                    attempts.setdefault(int(db_id), 0)
+        db_ids = sorted(attempts)
+        if len(db_ids) > MAX_DEAD_LETTER_IDS:
+            logging.error(f"{len(db_ids)} dbIds of {self.name} are dead-lettered, retrying the first {MAX_DEAD_LETTER_IDS}.")
+            db_ids = db_ids[:MAX_DEAD_LETTER_IDS]
+
+        if self.dbid_index is not None:
+            self.dbid_index.load()
+        if self.content_hash_index:
+            self.content_hash_index.load()
+        for rollup in self.rollups:
+            rollup.load()
+
+        recovered = []
+        for start in range(0, len(db_ids), MAX_FAILED_IDS):
+            batch = [str(db_id) for db_id in db_ids[start:start + MAX_FAILED_IDS]]
+            try:
+                items = self.item_fetcher.fetch_items_by_ids(batch)
+                failed_ids = {int(db_id) for db_id in items.get_failed_ids()}
+                recovered.extend(items.get_items())
+            except Exception as e:
+                logging.warning(f"Retrying dead-lettered dbIds of {self.name} failed: {e}")
+                failed_ids = {int(db_id) for db_id in batch}
+            # dbIds that are not returned and did not fail no longer exist, reconciliation handles those.
+            for db_id in batch:
+                if int(db_id) in failed_ids:
+                    attempts[int(db_id)] += 1
+                else:
+                    del attempts[int(db_id)]
+
+        given_up = sorted(db_id for db_id, count in attempts.items() if count >= MAX_DEAD_LETTER_ATTEMPTS)
+        if given_up:
+            logging.error(f"Dropping dbIds of {self.name} that failed {MAX_DEAD_LETTER_ATTEMPTS} retries: {given_up}")
+            for db_id in given_up:
+                del attempts[db_id]
+        logging.info(f"Recovered {len(recovered)} dead-lettered items of {self.name}, {len(attempts)} remain.")
+
+        if recovered:
+            items = ItemsResult(recovered, None)
+            items.set_constant_column("mutationType", "UPDATED")
+            parquet = _encode_change_file([items.to_table(self.explode_lists)], self.sort_key)
+            file_name = f"{self.name}-dead-letters-{_file_key(sorted(int(item['dbId']) for item in recovered))}.parquet"
+            self._ensure_lease()
+            self.data_lake_writer.write_data("filesystem", self.name, file_name, parquet)
+
+            self._ensure_lease()
+            if self.content_hash_index:
+                self.content_hash_index.update(recovered)
+                self.content_hash_index.save()
+            if self.dbid_index is not None:
+                self.dbid_index.add([item['dbId'] for item in recovered])
+                self.dbid_index.save()
+            for rollup in self.rollups:
+                rollup.apply_items(recovered)
+                rollup.save()
+
+        # The remaining dbIds replace the files that were read.
+        self._ensure_lease()
+        if attempts:
+            self.data_lake_writer.write_data("filesystem", directory, _RETRIED_DEAD_LETTERS,
+                                             json.dumps({str(db_id): count for db_id, count in sorted(attempts.items())}))
+        for file_name in file_names:
+            if file_name != _RETRIED_DEAD_LETTERS or not attempts:
+                self.data_lake_writer.delete_file("filesystem", directory, file_name)
+
+    def reconcile(self) -> None:
+        """
+        Compare the dbIds held in the data lake with the dbIds in Xledger and repair any drift.
+
+        Only dbIds are fetched for the comparison, and they are compared page by page. Items missing from the lake are fetched and written
+        as ADDED, and items no longer in Xledger are written as DELETED. The deltas cursor is not touched.
+        """
+        if self.dbid_index is None:
+            raise ValueError("Reconciliation requires a dbId index.")
+
+        self.dbid_index.load()
+        if self.content_hash_index:
+            self.content_hash_index.load()
+        for rollup in self.rollups:
+            rollup.load()
+
+        # Compare the lake with Xledger page by page. The API takes and returns dbIds as Int64String.
+        missing, extra = self.dbid_index.diff_pages(self.item_fetcher.iter_id_pages())
+        missing = [str(db_id) for db_id in missing]
+        extra = [str(db_id) for db_id in extra]
+        logging.info(f"Reconciliation for {self.name}: {len(missing)} missing and {len(extra)} extra items.")
+        if not missing and not extra:
+            return
+
+        # Fetch the missing items and mark the extra ones as deleted.
+        repaired_tables = []
+        if missing:
+            additions = self.item_fetcher.fetch_items_by_ids(missing)
+            failed_ids = set(additions.get_failed_ids())
+            missing = [db_id for db_id in missing if db_id not in failed_ids]
+            self._dead_letter([additions])
+            if self.content_hash_index:
+                self.content_hash_index.update(additions.get_items())
+            for rollup in self.rollups:
+                rollup.apply_items(additions.get_items())
+            additions.set_constant_column("mutationType", "ADDED")
+            repaired_tables.append(additions.to_table(self.explode_lists))
+
+        if extra:
+            repaired_tables.append(_deletions_table(extra))
+            if self.content_hash_index:
+                self.content_hash_index.remove(extra)
+            for rollup in self.rollups:
+                rollup.apply_deletions(extra)
+
+        # Transform items.
+        parquet = _encode_change_file(repaired_tables, self.sort_key)
+
+        # Write items to data lake.
+        # Named after the repaired dbIds, so a retried reconciliation overwrites its own file.
+        file_name = f"{self.name}-reconciliation-{_file_key(sorted(missing), sorted(extra))}.parquet"
+        self._ensure_lease()
+        self.data_lake_writer.write_data("filesystem", self.name, file_name, parquet)
+
+        # Update indexes.
+        self._ensure_lease()
+        if self.content_hash_index:
+            self.content_hash_index.save()
+        self.dbid_index.add(missing)
+        self.dbid_index.remove(extra)
+        self.dbid_index.save()
+        for rollup in self.rollups:
+            rollup.save()
+
+    def export_csv(self, fieldnames: List[str], compress: bool = True) -> str:
+        """
+        Export every item as one CSV file to `<name>_csv/` for consumers that require CSV.
+
+        Pages are flattened, encoded and uploaded as they arrive, so only one page is held at a time.
+        Flattened keys outside the declared columns are left out.
+
+        :param fieldnames: The columns of the file, as flattened keys of the items.
+        :param compress: Whether to gzip-compress the file.
+        :return: The name of the written file.
+        """
+        pages = (flatten_list_of_dicts(page, explode_lists=self.explode_lists)
+                 for page in self.item_fetcher.iter_item_pages_after_cursor())
+        file_name = f"{get_current_time_for_filename()}-{self.name}.csv{'.gz' if compress else ''}"
+        self.data_lake_writer.write_chunks("filesystem", f"{self.name}_csv", file_name,
+                                           stream_dicts_to_csv(pages, fieldnames, compress=compress))
+        return file_name
+
+    def dispatch_changes(self, queue: StorageWorkQueue, chunk_size: int = 1000, batch_timeout: int = 3600) -> bool:
+        """
+        Split the pending deltas into dbId chunks and send them to a queue for workers to process.
+
+        One window of deltas is dispatched as a batch. The deltas cursor is only advanced by
+        `process_chunk` once every chunk of the batch has been written, and no new batch is
+        dispatched while one is pending. A batch that does not complete within the timeout, e.g.
+        because a chunk ended up in the poison queue, is abandoned and its window dispatched again.
+        The content hash and dbId indexes and the rollups are not maintained in this mode, since
+        chunks are written concurrently. The run is recorded in the metrics when its batch completes.
+
+        :param queue: The queue to send the chunks to.
+        :param chunk_size: Maximum number of dbIds per chunk.
+        :param batch_timeout: Seconds after which a pending batch is abandoned.
+        :return: False if the run was skipped because a batch is still pending, True otherwise.
+        """
+        if self.content_hash_index or self.dbid_index is not None or self.rollups:
+            raise ValueError("Distributed syncronization does not maintain indexes or rollups.")
+
+        pending_batch = self.state_manager.pending_batch
+        if pending_batch:
+            # Batches dispatched before the dispatch time was recorded count as expired.
+            dispatched_at = self.state_manager.pending_batch_at
+            now = datetime.now(timezone.utc)
+            if dispatched_at and now - datetime.fromisoformat(dispatched_at) < timedelta(seconds=batch_timeout):
+                logging.info(f"Batch {pending_batch} of {self.name} is still being processed.")
+                return False
+
+            # Late chunks of the abandoned batch are ignored by process_chunk.
+            logging.warning(f"Batch {pending_batch} of {self.name} did not complete in {batch_timeout} seconds, dispatching it again.")
+            self.state_manager.pending_batch = ""
+            self.data_lake_writer.delete_directory("filesystem", f"{self.name}/_state/batches/{pending_batch}")
+
+        self.metrics = RunMetrics(self.name, self.state_manager.last_run_started_at)
+        deltas = self.delta_fetcher.fetch_deltas(
+            {"first": self.delta_window_size or 10000, "after": self.state_manager.deltas_cursor},
+            max_deltas=self.delta_window_size
+        )
+        self.delta_count = deltas.event_count or deltas.count()
+        self.metrics.record_window(deltas)
+        if not deltas.has_changes():
+            logging.info(f"No changes found for {self.name}.")
+            self._record_run()
+            return True
+
+        chunks = []
+        for mutation_type, db_ids in (("ADDED", deltas.get_additions()),
+                                      ("UPDATED", deltas.get_updates()),
+                                      ("DELETED", deltas.get_deletions())):
+            for start in range(0, len(db_ids), chunk_size):
+                chunks.append((mutation_type, db_ids[start:start + chunk_size]))
+
+        # Mark the batch as pending before any worker can complete it.
+        batch_id = uuid.uuid4().hex
+        self.state_manager.pending_batch_at = datetime.now(timezone.utc).replace(microsecond=0).isoformat()
+        self.state_manager.pending_batch = batch_id
+        for chunk_index, (mutation_type, db_ids) in enumerate(chunks):
+            queue.send({
+                "entity": self.name,
+                "batch_id": batch_id,
+                "chunk_index": chunk_index,
+                "chunk_count": len(chunks),
+                "mutation_type": mutation_type,
+                "db_ids": db_ids,
+                "last_cursor": deltas.last_cursor,
+                # Carried along so the worker completing the batch can record the run.
+                "started_at": self.metrics.started_at.isoformat(),
+                "event_count": self.metrics.backlog_events
+            })
+        logging.info(f"Dispatched batch {batch_id} of {self.name} as {len(chunks)} chunks.")
+        return True
+
+    def process_chunk(self, message: Dict[str, Any]) -> None:
+        """
+        Fetch, encode and write one chunk dispatched by `dispatch_changes`.
+
+        The file name is derived from the batch and chunk, so a retried chunk overwrites its own
+        output. dbIds that fail to be fetched are dead-lettered to a file of their own, so concurrent
+        chunks do not write to the same state. The worker that
+        acknowledges the last chunk of a batch advances the deltas cursor. Chunks of a batch that is
+        no longer pending, because it was abandoned and dispatched again, are skipped.
+
+        :param message: The chunk message.
+        """
+        batch_id = message["batch_id"]
+        chunk_index = message["chunk_index"]
+        mutation_type = message["mutation_type"]
+
+        if self.state_manager.pending_batch != batch_id:
+            logging.info(f"Skipping chunk {chunk_index} of {self.name}, batch {batch_id} is no longer pending.")
+            return
+
+        if mutation_type == "DELETED":
+            table = _deletions_table(message["db_ids"])
+        else:
+            items = self.item_fetcher.fetch_items_by_ids(message["db_ids"])
+            self._dead_letter([items])
+            items.set_constant_column("mutationType", mutation_type)
+            table = items.to_table(self.explode_lists)
+
+        # Write items to data lake.
+        if table.num_rows:
+            parquet = _encode_change_file([table], self.sort_key)
+            self.data_lake_writer.write_data("filesystem", self.name, f"{batch_id}-{chunk_index:04d}-{self.name}.parquet", parquet)
+
+        # Acknowledge the chunk and complete the batch once every chunk is acknowledged.
+        batch_directory = f"{self.name}/_state/batches/{batch_id}"
+        self.data_lake_writer.write_data("filesystem", batch_directory, f"{chunk_index}.done", str(table.num_rows))
+        acknowledged = len(self.data_lake_writer.list_files("filesystem", batch_directory))
+        if acknowledged < message["chunk_count"] or self.state_manager.pending_batch != batch_id:
+            return
+
+        self.state_manager.deltas_cursor = message["last_cursor"]
+        self.state_manager.pending_batch = ""
+        self._record_batch(message, batch_directory)
+        self.data_lake_writer.delete_directory("filesystem", batch_directory)
+        logging.info(f"Completed batch {batch_id} of {self.name}.")
+
+    def _record_batch(self, message: Dict[str, Any], batch_directory: str) -> None:
+        # The run spans from the dispatch until the last chunk is written.
+        self.metrics = RunMetrics(self.name, self.state_manager.last_run_started_at,
+                                  datetime.fromisoformat(message["started_at"]))
+        self.metrics.record_window(DeltasResult(set(), set(), set(), message["last_cursor"],
+                                                event_count=message["event_count"]))
+        # Every acknowledgement holds the number of rows its chunk wrote.
+        for file_name in self.data_lake_writer.list_files("filesystem", batch_directory):
+            self.metrics.record_rows(int(self.data_lake_writer.read_data("filesystem", batch_directory, file_name) or 0))
+        self._record_run()
+
+
+class AsyncDataSynchronizer:
+    """
+    Asynchronous counterpart of DataSynchronizer.
+
+    Additions and updates of a window are fetched concurrently, Parquet encoding runs in a worker
+    thread, and the upload of one window overlaps with fetching the next. The deltas cursor is still
+    advanced strictly in window order, after the window's file has been written.
+    """
+
+    def __init__(self,
+                 name: str,
+                 delta_fetcher: AsyncDeltaFetcher,
+                 item_fetcher: AsyncItemFetcher,
+                 data_lake_writer: AsyncDataLakeWriter,
+                 state_manager: AsyncSynchronizerStateManager,
+                 delta_window_size: int = None,
+                 explode_lists: bool = True,
+                 sort_key: str = None,
+                 metrics_sink: LoggingMetricsSink = None,
+                 lease: AsyncDataLakeLease = None) -> None:
+        self.name = name
+        self.delta_fetcher = delta_fetcher
+        self.item_fetcher = item_fetcher
+        self.state_manager = state_manager
+        self.data_lake_writer = data_lake_writer
+        self.delta_window_size = delta_window_size
+        self.explode_lists = explode_lists
+        self.sort_key = sort_key
+        self.metrics_sink = metrics_sink or LoggingMetricsSink()
+        self.lease = lease
+        self.metrics = RunMetrics(name)
+        self.delta_count = 0
+
+    def _ensure_lease(self) -> None:
+        # Stop before writing when the lease of the entity was lost to another instance.
+        if self.lease is not None:
+            self.lease.ensure_held()
+
+    async def syncronize(self, sync_from_scratch: bool = None) -> None:
+        self.delta_count = 0
+        self.metrics = RunMetrics(self.name, await self.state_manager.get_last_run_started_at())
+        if sync_from_scratch is None:
+            sync_from_scratch = not await self.state_manager.get_initial_sync_complete()
+
+        if sync_from_scratch:
+            await self._full_syncronization()
+        else:
+            await self._syncronize_changes()
+
+        # Only completed runs are recorded.
+        metrics = self.metrics.finish()
+        self._ensure_lease()
+        await self.state_manager.set_last_run_started_at(metrics["started_at"])
+        await self.state_manager.set_last_run_metrics(metrics)
+        self.metrics_sink.emit(metrics)
+
+    async def _full_syncronization(self) -> None:
+        # Get the last delta and all items.
+        deltas, items = await asyncio.gather(
+            self.delta_fetcher.fetch_deltas({"last": 1}),
+            self.item_fetcher.fetch_all_items_after_cursor(first=10000)
+        )
+        if not items.has_items():
+            logging.info(f"No items found for {self.name}.")
+            return
 
         # Transform items.
-        parquet = convert_dicts_to_parquet(flatten_list_of_dicts(all_changed_items))
+        items.set_constant_column("mutationType", "ADDED")
+        parquet = await asyncio.to_thread(self._encode, [items])
+        self.metrics.record_rows(len(items.get_items()))
 
         # Write items to data lake.
-        self.data_lake_writer.write_data("filesystem", self.name, f"{get_current_time_for_filename()}-{self.name}.parquet", parquet)
+        self._ensure_lease()
+        await self.data_lake_writer.write_data("filesystem", self.name, f"{self.name}-full.parquet", parquet)
 
         # Update state.
-        self.state_manager.deltas_cursor = deltas.last_cursor
+        self._ensure_lease()
+        await self.state_manager.set_initial_sync_cursor(items.get_last_item_cursor())
+        await self.state_manager.set_initial_sync_complete(True)
+        await self.state_manager.set_deltas_cursor(deltas.last_cursor)
+
+    async def _syncronize_changes(self) -> None:
+        cursor = await self.state_manager.get_deltas_cursor()
+        pending_write = None
+        window_index = 0
+
+        try:
+            while True:
+                deltas = await self.delta_fetcher.fetch_deltas(
+                    {"first": self.delta_window_size or 10000, "after": cursor},
+                    max_deltas=self.delta_window_size
+                )
+                self.delta_count += deltas.event_count or deltas.count()
+                self.metrics.record_window(deltas)
+                if not deltas.has_changes():
+                    if window_index == 0:
+                        logging.info(f"No changes found for {self.name}.")
+                    break
+
+                changed_items = await self._fetch_changed_items(deltas)
+                failed_ids = _failed_ids(changed_items)
+                if failed_ids:
+                    self._ensure_lease()
+                    await self.data_lake_writer.write_data("filesystem", f"{self.name}/{DEAD_LETTER_DIRECTORY}",
+                                                           _dead_letter_file_name(failed_ids), json.dumps(failed_ids))
+                    logging.warning(f"Dead-lettered dbIds of {self.name}: {failed_ids}")
+
+                # Writes and cursor updates must happen in window order.
+                if pending_write:
+                    await pending_write
+                pending_write = asyncio.create_task(self._write_window(changed_items, cursor, deltas.last_cursor))
+
+                cursor = deltas.last_cursor
+                window_index += 1
+                if not self.delta_window_size or not deltas.has_more:
+                    break
+        finally:
+            if pending_write:
+                await pending_write
+
+    async def _fetch_changed_items(self, deltas: DeltasResult) -> List[ItemsResult]:
+        additions, updates = await asyncio.gather(
+            self.item_fetcher.fetch_items_by_ids(deltas.get_additions()),
+            self.item_fetcher.fetch_items_by_ids(deltas.get_updates())
+        )
+        additions.set_constant_column("mutationType", "ADDED")
+        updates.set_constant_column("mutationType", "UPDATED")
+
+        deletions = ItemsResult([{"dbId": dbId} for dbId in deltas.get_deletions()], None)
+        deletions.set_constant_column("mutationType", "DELETED")
+        return [additions, updates, deletions]
+
+    async def _write_window(self, items: List[ItemsResult], after_cursor: str, last_cursor: str) -> None:
+        # Transform items off the event loop.
+        parquet = await asyncio.to_thread(self._encode, items)
+
+        # Write items to data lake, unless nothing could be fetched, e.g. every item was deleted since.
+        if parquet is not None:
+            self._ensure_lease()
+            await self.data_lake_writer.write_data("filesystem", self.name, window_file_name(self.name, after_cursor), parquet)
+            self.metrics.record_rows(sum(len(result.get_items()) for result in items))
+        else:
+            logging.info(f"No items to write for a window of {self.name}.")
+
+        # Update state.
+        self._ensure_lease()
+        await self.state_manager.set_deltas_cursor(last_cursor)
+
+    def _encode(self, results: List[ItemsResult]):
+        tables = [result.to_table(self.explode_lists) for result in results if result.has_items()]
+        if not tables:
+            return None
+        return _encode_change_file(tables, self.sort_key)
+
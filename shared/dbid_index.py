@@ -0,0 +1,177 @@
+import logging
+import os
+import tempfile
+from io import BytesIO
+from typing import Any, Iterable, List, Tuple
+import numpy as np
+from shared.data_lake_writer import DataLakeWriter
+
+
+class DbIdIndex:
+    """
+    A persistent, sorted set of the dbIds currently held in the data lake for an entity.
+
+    The index is stored in the data lake as a raw little-endian int64 array, sorted ascending,
+    in a `_state` directory next to the entity's output. On load it is copied to a local file
+    and memory-mapped, so membership tests are binary searches over the mapped array and the
+    index never has to be parsed into Python objects. Changes are buffered and merged into a
+    new sorted array on save.
+    """
+
+    def __init__(self, data_lake_writer: DataLakeWriter, file_system_name: str, directory_name: str,
+                 file_name: str = "dbids.bin", local_directory: str = None) -> None:
+        """
+        Initialize the DbIdIndex.
+
+        :param data_lake_writer: Writer used to load and persist the index.
+        :param file_system_name: Name of the file system (container) holding the index.
+        :param directory_name: Name of the directory holding the index.
+        :param file_name: Name of the index file.
+        :param local_directory: Directory for the memory-mapped copy, defaults to the system temp directory.
+        """
+        self.data_lake_writer = data_lake_writer
+        self.file_system_name = file_system_name
+        self.directory_name = directory_name
+        self.file_name = file_name
+        local_directory = local_directory or os.path.join(tempfile.gettempdir(), "xledger-syncronizer")
+        self.local_path = os.path.join(local_directory, directory_name.replace('/', '_'), file_name)
+        self._db_ids = np.empty(0, dtype='<i8')
+        self._added = set()
+        self._removed = set()
+
+    def load(self) -> None:
+        """
+        Download the index from the data lake and memory-map it. A missing index results in an empty index.
+        """
+        self._added.clear()
+        self._removed.clear()
+
+        data = self.data_lake_writer.read_data(self.file_system_name, self.directory_name, self.file_name)
+        if not data:
+            self._db_ids = np.empty(0, dtype='<i8')
+            return
+
+        self._write_local(data)
+        self._db_ids = np.memmap(self.local_path, dtype='<i8', mode='r')
+        logging.info(f"Loaded dbId index with {len(self._db_ids)} ids from '{self.directory_name}/{self.file_name}'.")
+
+    def save(self) -> None:
+        """
+        Merge buffered changes into the sorted array and persist it to the data lake.
+        """
+        if not self._added and not self._removed:
+            return
+
+        data = self.to_array().tobytes()
+
+        self.data_lake_writer.write_data(self.file_system_name, self.directory_name, self.file_name, BytesIO(data))
+
+        # Release the old mapping before replacing the file it maps.
+        self._db_ids = np.empty(0, dtype='<i8')
+        self._write_local(data)
+        self._db_ids = np.memmap(self.local_path, dtype='<i8', mode='r') if data else self._db_ids
+        self._added.clear()
+        self._removed.clear()
+
+    def _write_local(self, data: bytes) -> None:
+        os.makedirs(os.path.dirname(self.local_path), exist_ok=True)
+        with open(self.local_path, 'wb') as f:
+            f.write(data)
+
+    def __len__(self) -> int:
+        return (len(self._db_ids) + len(self._added)
+                - self._count_persisted(self._added) - self._count_persisted(self._removed))
+
+    def _count_persisted(self, db_ids: set) -> int:
+        if not db_ids:
+            return 0
+        return int(np.count_nonzero(self._contains_persisted(np.fromiter(db_ids, dtype='<i8', count=len(db_ids)))))
+
+    def _contains_persisted(self, db_ids: np.ndarray) -> np.ndarray:
+        if len(self._db_ids) == 0:
+            return np.zeros(len(db_ids), dtype=bool)
+        positions = np.searchsorted(self._db_ids, db_ids)
+        positions[positions == len(self._db_ids)] = 0
+        return self._db_ids[positions] == db_ids
+
+    def contains(self, db_ids: Iterable[Any]) -> List[bool]:
+        """
+        Check which of the given dbIds are held in the data lake.
+
+        :param db_ids: The dbIds to check.
+        :return: A list with one boolean per given dbId.
+        """
+        db_ids = [int(db_id) for db_id in db_ids]
+        persisted = self._contains_persisted(np.array(db_ids, dtype='<i8'))
+        return [(bool(found) or db_id in self._added) and db_id not in self._removed
+                for db_id, found in zip(db_ids, persisted)]
+
+    def add(self, db_ids: Iterable[Any]) -> None:
+        """
+        Record that the given dbIds were written to the data lake.
+
+        :param db_ids: The dbIds to add.
+        """
+        for db_id in db_ids:
+            db_id = int(db_id)
+            self._removed.discard(db_id)
+            self._added.add(db_id)
+
+    def remove(self, db_ids: Iterable[Any]) -> None:
+        """
+        Record that the given dbIds were deleted.
+
+        :param db_ids: The dbIds to remove.
+        """
+        for db_id in db_ids:
+            db_id = int(db_id)
+            self._added.discard(db_id)
+            self._removed.add(db_id)
+
+    def reset(self, db_ids: Iterable[Any]) -> None:
+        """
+        Replace the whole index, used after a full synchronization.
+
+        :param db_ids: All dbIds held in the data lake.
+        """
+        self._db_ids = np.empty(0, dtype='<i8')
+        self._removed.clear()
+        self._added = {int(db_id) for db_id in db_ids}
+
+    def to_array(self) -> np.ndarray:
+        """
+        Return the index, including buffered changes, as a sorted int64 array.
+
+        :return: The sorted dbIds.
+        """
+        db_ids = np.asarray(self._db_ids)
+        if self._added:
+            db_ids = np.union1d(db_ids, np.fromiter(self._added, dtype='<i8', count=len(self._added)))
+        if self._removed:
+            db_ids = np.setdiff1d(db_ids, np.fromiter(self._removed, dtype='<i8', count=len(self._removed)),
+                                  assume_unique=True)
+        return db_ids.astype('<i8', copy=False)
+
+    def diff_pages(self, pages: Iterable[Iterable[Any]]) -> Tuple[List[int], List[int]]:
+        """
+        Compare the index with the dbIds from the source, one page at a time.
+
+        Only the index and a flag per indexed dbId are held, never the complete set of source dbIds,
+        so the source can be streamed straight from the API.
+
+        :param pages: Pages of dbIds that together hold every dbId currently in the source.
+        :return: A tuple of the dbIds missing from the index and the dbIds in the index but not in the source.
+        """
+        held = self.to_array()
+        seen = np.zeros(len(held), dtype=bool)
+        missing = []
+        for page in pages:
+            page = np.unique(np.fromiter((int(db_id) for db_id in page), dtype='<i8'))
+            if not len(page):
+                continue
+            positions = np.searchsorted(held, page)
+            found = positions < len(held)
+            found[found] = held[positions[found]] == page[found]
+            seen[positions[found]] = True
+            missing.extend(page[~found].tolist())
+        return sorted(set(missing)), held[~seen].tolist()
@@ -1,14 +1,21 @@
-from shared.gql_client import GraphQLClient, PaginationQueryResult
+from shared.gql_client import GraphQLClient, AsyncGraphQLClient, PaginationQueryResult
 from typing import Dict, Any
 import logging
 
 
 class DeltasResult:
-    def __init__(self, additions: set, updates: set, deletions: set, last_cursor: str) -> None:
+    def __init__(self, additions: set, updates: set, deletions: set, last_cursor: str, has_more: bool = False,
+                 event_count: int = 0) -> None:
         self.additions = additions
         self.updates = updates
         self.deletions = deletions
         self.last_cursor = last_cursor
+        self.has_more = has_more
+        # Number of delta events before they were merged per dbId.
+        self.event_count = event_count
+
+    def count(self) -> int:
+        return len(self.additions) + len(self.updates) + len(self.deletions)
 
     def has_changes(self) -> bool:
         return bool(self.additions or self.updates or self.deletions)
@@ -37,16 +44,24 @@ class DeltaFetcher:
         self.graphql_client = client
         self.query = query
 
-    def fetch_deltas(self, variables: Dict[str, Any]) -> DeltasResult:
+    def fetch_deltas(self, variables: Dict[str, Any], max_deltas: int = None) -> DeltasResult:
+        """
+        Fetch deltas and classify them by mutation type.
+
+        :param variables: Variables for the deltas query, typically 'first' and 'after'.
+        :param max_deltas: Optional size of the delta window. When set, at most this many delta
+                           events are fetched and `has_more` on the result tells if the window was cut short.
+        :return: A DeltasResult for the fetched window.
+        """
         try:
-            query_result = self._execute_paginated_query(variables)
+            query_result = self._execute_paginated_query(variables, max_deltas)
             return self._extract_deltas(query_result)
         except Exception as e:
             logging.error(f"Error fetching deltas: {e}")
             raise
 
-    def _execute_paginated_query(self, variables: Dict[str, Any]) -> PaginationQueryResult:
-        return self.graphql_client.paginate_gql_query(self.query, variables)
+    def _execute_paginated_query(self, variables: Dict[str, Any], max_items: int = None) -> PaginationQueryResult:
+        return self.graphql_client.paginate_gql_query(self.query, variables, max_items=max_items)
 
     def _extract_deltas(self, result: PaginationQueryResult) -> DeltasResult:
         additions = set()
@@ -54,10 +69,9 @@ class DeltaFetcher:
         deletions = set()
 
         if not result.has_results():
-            return DeltasResult(additions, updates, deletions, result.get_last_cursor())
+            return DeltasResult(additions, updates, deletions, result.get_last_cursor(), result.has_next_page)
 
-        for edge in result.edges:
-            node = edge['node']
+        for node in result.get_nodes():
             mutation_type = node.get('mutationType')
             db_id = node.get('dbId')
 
@@ -71,4 +85,23 @@ class DeltaFetcher:
         updates -= deletions
         additions -= deletions
 
-        return DeltasResult(additions, updates, deletions, result.get_last_cursor())
+        return DeltasResult(
+            additions, updates, deletions, result.get_last_cursor(), result.has_next_page,
+            event_count=len(result)
+        )
+
+
+class AsyncDeltaFetcher(DeltaFetcher):
+    def __init__(self, client: AsyncGraphQLClient, query: str) -> None:
+        super().__init__(client, query)
+
+    async def fetch_deltas(self, variables: Dict[str, Any], max_deltas: int = None) -> DeltasResult:
+        try:
+            query_result = await self._execute_paginated_query(variables, max_deltas)
+            return self._extract_deltas(query_result)
+        except Exception as e:
+            logging.error(f"Error fetching deltas: {e}")
+            raise
+
+    async def _execute_paginated_query(self, variables: Dict[str, Any], max_items: int = None) -> PaginationQueryResult:
+        return await self.graphql_client.paginate_gql_query(self.query, variables, max_items=max_items)
@@ -1,8 +1,23 @@
+import asyncio
+import json
 import logging
-from typing import Dict, List, Any
-from gql import Client
+from typing import Dict, Iterator, List, Any
+from gql import Client, GraphQLRequest
 from gql.transport.aiohttp import AIOHTTPTransport
-from tenacity import retry, stop_after_attempt, wait_exponential
+from gql.transport.async_transport import AsyncTransport
+from gql.transport.exceptions import TransportQueryError
+from tenacity import retry, retry_if_exception, stop_after_attempt, wait_exponential
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import brotli  # noqa: F401 - aiohttp decodes br responses when this is installed.
+    BROTLI_AVAILABLE = True
+except ImportError:
+    BROTLI_AVAILABLE = False
 
 
 class GraphQLQueryException(Exception):
@@ -10,24 +25,144 @@ class GraphQLQueryException(Exception):
     pass
 
 
+def is_query_error(error: BaseException) -> bool:
+    """
+    Tell whether a query failed because the server returned errors for it, as opposed to the request
+    failing, e.g. on a connection error or timeout.
+
+    :param error: The raised exception, possibly wrapping the original one.
+    :return: True if the server returned GraphQL errors.
+    """
+    while error is not None:
+        if isinstance(error, TransportQueryError):
+            return True
+        error = error.__cause__
+    return False
+
+
+def _should_retry(error: BaseException) -> bool:
+    # Errors returned by the server come back the same on a retry.
+    return not is_query_error(error)
+
+
+_retry = retry(stop=stop_after_attempt(3), wait=wait_exponential(multiplier=1, min=2, max=10),
+               retry=retry_if_exception(_should_retry))
+
+
+def _json_loads(data):
+    """
+    Decode a JSON response body, using orjson when it is installed.
+
+    :param data: The response body.
+    :return: The decoded JSON.
+    """
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+def create_transport(api_endpoint: str, api_key: str, compress_responses: bool = True) -> AIOHTTPTransport:
+    """
+    Creates the aiohttp transport used by the GraphQL clients.
+
+    Large pages are multi-megabyte JSON, so compressed responses are requested explicitly and
+    decoded with orjson when available.
+
+    :param api_endpoint: The endpoint URL of the GraphQL API.
+    :param api_key: The API key for authentication.
+    :param compress_responses: Whether to ask the server for gzip (and br, when brotli is installed) responses.
+    :return: A configured transport.
+    """
+    headers = {"Authorization": f"token {api_key}"}
+    if compress_responses:
+        headers["Accept-Encoding"] = "gzip, br" if BROTLI_AVAILABLE else "gzip"
+    return AIOHTTPTransport(url=api_endpoint, headers=headers, json_deserialize=_json_loads)
+
+
+class PreparedQueries:
+    """
+    Validates each query against the schema once and executes it without re-validating.
+
+    gql validates the request on every `execute` when the client holds a schema, and
+    `paginate_gql_query` executes the same request once per page. Requests are the module-level
+    `gql(...)` constants from the entity `queries.py` modules, so they are cached by identity.
+    """
+
+    def __init__(self) -> None:
+        self._validated: Dict[int, GraphQLRequest] = {}
+
+    def prepare(self, client: Client, query: GraphQLRequest) -> GraphQLRequest:
+        """
+        Validate the query the first time it is seen once the client has a schema.
+
+        :param client: The gql client holding the schema.
+        :param query: The parsed query, as returned by `gql`.
+        :return: The validated query.
+        """
+        if id(query) not in self._validated and client.schema is not None:
+            client.validate(query)
+            self._validated[id(query)] = query
+        return query
+
+    async def execute(self, session, query: GraphQLRequest, variables: Dict[str, Any] = None) -> Dict[str, Any]:
+        """
+        Execute a prepared query directly on the session's transport.
+
+        :param session: An open gql async session.
+        :param query: The parsed query, as returned by `gql`.
+        :param variables: A dictionary of variables to be passed with the query.
+        :return: The data of the query result.
+        :raises TransportQueryError: If the server returned errors.
+        """
+        self.prepare(session.client, query)
+        result = await asyncio.wait_for(
+            session.transport.execute(GraphQLRequest(query, variable_values=variables)),
+            session.client.execute_timeout
+        )
+        if result.errors:
+            raise TransportQueryError(str(result.errors[0]), errors=result.errors, data=result.data,
+                                      extensions=result.extensions)
+        return result.data
+
+
 class PaginationQueryResult:
     """
     Class to encapsulate the results of a paginated GraphQL query.
 
+    Only the node payloads are kept. Per-edge cursors are dropped as pages are added, except for the
+    cursor of the last edge, which is all that is needed to continue paginating.
+
     Attributes:
-        edges (list): The list of edges (data items) returned by the query.
+        nodes (list): The list of nodes (data items) returned by the query.
         last_cursor (str): The cursor for the last item fetched, used for pagination.
+        page_boundaries (list): The number of nodes fetched after each page.
+        has_next_page (bool): Whether the server reported more pages after the last edge.
     """
-    def __init__(self, edges: List[Dict[str, Any]]) -> None:
-        self.edges = edges
+    def __init__(self, nodes: List[Dict[str, Any]] = None, last_cursor: str = None, has_next_page: bool = False) -> None:
+        self.nodes = nodes if nodes is not None else []
+        self.last_cursor = last_cursor
+        self.page_boundaries = [len(self.nodes)] if self.nodes else []
+        self.has_next_page = has_next_page
+
+    def add_page(self, edges: List[Dict[str, Any]]) -> None:
+        """
+        Adds the nodes of a page of edges and remembers the cursor of its last edge.
+
+        :param edges: The edges of the page.
+        """
+        if not edges:
+            return
+        self.nodes.extend(edge['node'] for edge in edges)
+        self.last_cursor = edges[-1]['cursor']
+        self.page_boundaries.append(len(self.nodes))
 
     def get_nodes(self) -> List[Dict[str, Any]]:
         """
-        Returns the list of nodes (data items) extracted from the edges.
+        Returns the list of nodes (data items).
 
         :return: A list of nodes.
         """
-        return [edge['node'] for edge in self.edges]
+        return self.nodes
     
     def get_last_cursor(self) -> str:
         """
@@ -35,10 +170,55 @@ class PaginationQueryResult:
 
         :return: The cursor for the last item.
         """
-        return self.edges[-1]['cursor'] if self.edges else None
+        return self.last_cursor
     
     def has_results(self) -> bool:
-        return len(self.edges) > 0
+        return len(self.nodes) > 0
+
+    def __len__(self) -> int:
+        return len(self.nodes)
+
+
+def _limit_page_size(results: PaginationQueryResult, variables: Dict[str, Any], max_items: int = None) -> None:
+    # Never ask for more edges than are left in the window.
+    if max_items is not None:
+        remaining = max_items - len(results)
+        variables['first'] = min(variables.get('first') or remaining, remaining)
+
+
+def _add_page(results: PaginationQueryResult, result: Dict[str, Any], variables: Dict[str, Any], max_items: int = None) -> bool:
+    """
+    Add a page of a paginated query to the results and prepare the variables for the next page.
+
+    Shared by the sync and async clients, which only differ in how the query is executed.
+
+    :param results: The results so far.
+    :param result: The result of the query for the page.
+    :param variables: The query variables, 'after' is moved to the last cursor.
+    :param max_items: Optional upper bound on the number of edges to fetch.
+    :return: True if another page should be fetched.
+    :raises GraphQLQueryException: If no data is found.
+    """
+    query_name = next(iter(result))
+    data = result.get(query_name)
+    if not data:
+        raise GraphQLQueryException(f"No data found for query: {query_name}")
+
+    # Keep the nodes and last cursor from current page.
+    results.add_page(data.get('edges'))
+
+    # Check if there is a next page.
+    results.has_next_page = data['pageInfo']['hasNextPage']
+    if not results.has_next_page:
+        return False
+
+    # Stop when the window is full.
+    if max_items is not None and len(results) >= max_items:
+        return False
+
+    # Update variables for the next page.
+    variables['after'] = results.get_last_cursor()
+    return True
 
 
 class GraphQLClient:
@@ -51,16 +231,21 @@ class GraphQLClient:
         client (Client): The gql Client instance for executing queries.
     """
 
-    def __init__(self, api_endpoint: str, api_key: str):
+    def __init__(self, api_endpoint: str, api_key: str, compress_responses: bool = True, transport: AsyncTransport = None):
         """
         Initializes the GraphQLClient with the given API endpoint and API key.
 
         :param api_endpoint: The endpoint URL of the GraphQL API.
         :param api_key: The API key for authentication.
+        :param compress_responses: Whether to request compressed responses.
+        :param transport: Optional transport to use instead of the default one, e.g. for recording or replay.
         """
         self.api_endpoint = api_endpoint
         self.api_key = api_key
+        self.compress_responses = compress_responses
+        self.transport = transport
         self.client = self._create_client()
+        self.prepared_queries = PreparedQueries()
 
     def _create_client(self) -> Client:
         """
@@ -68,69 +253,99 @@ class GraphQLClient:
 
         :return: A configured gql Client instance.
         """
-        headers = {"Authorization": f"token {self.api_key}"}
-        transport = AIOHTTPTransport(url=self.api_endpoint, headers=headers)
+        transport = self.transport or create_transport(self.api_endpoint, self.api_key, self.compress_responses)
         return Client(transport=transport, fetch_schema_from_transport=True, execute_timeout=60)
 
-    @retry(stop=stop_after_attempt(3), wait=wait_exponential(multiplier=1, min=2, max=10))
+    @_retry
     def execute_graphql_query(self, query: str, variables: Dict[str, Any] = None) -> Dict[str, Any]:
         """
-        Executes a GraphQL query and returns the result.
+        Executes a GraphQL query and returns the result, retrying failed requests.
 
         :param query: The GraphQL query string.
         :param variables: A dictionary of variables to be passed with the query.
         :return: A dictionary representing the query result.
         :raises GraphQLQueryException: If an error occurs during query execution.
         """
+        return self._execute_graphql_query(query, variables)
+
+    def _execute_graphql_query(self, query: str, variables: Dict[str, Any] = None) -> Dict[str, Any]:
         try:
             logging.debug(f"Executing GraphQL query: {query} with variables: {variables}")
-            return self.client.execute(query, variable_values=variables)
+            return self._get_event_loop().run_until_complete(self._execute_prepared(query, variables))
         except Exception as e:
             logging.error(f"An error occurred: {str(e)}")
-            raise GraphQLQueryException(f"An error occurred: {str(e)}")
+            raise GraphQLQueryException(f"An error occurred: {str(e)}") from e
+
+    async def _execute_prepared(self, query: str, variables: Dict[str, Any] = None) -> Dict[str, Any]:
+        async with self.client as session:
+            return await self.prepared_queries.execute(session, query, variables)
+
+    @staticmethod
+    def _get_event_loop() -> asyncio.AbstractEventLoop:
+        try:
+            return asyncio.get_event_loop()
+        except RuntimeError:
+            loop = asyncio.new_event_loop()
+            asyncio.set_event_loop(loop)
+            return loop
 
-    def paginate_gql_query(self, query: str, variables: Dict[str, Any]) -> PaginationQueryResult:
+    def paginate_gql_query(self, query: str, variables: Dict[str, Any], max_items: int = None,
+                           retries: bool = True) -> PaginationQueryResult:
         """
         Fetches all data by paginating over a GraphQL query.
 
         :param query: The GraphQL query string that includes pagination.
         :param variables: Initial variables for the query, typically includes 'first' and optionally 'after'.
-        :param query_name: The name of the query to extract results from the response.
+        :param max_items: Optional upper bound on the number of edges to fetch. Pagination stops as soon
+                          as the bound is reached, and 'first' is lowered so the last page does not overshoot.
+        :param retries: Whether failed requests are retried.
         :return: A PaginationQueryResult containing all fetched items and the last cursor.
         :raises GraphQLQueryException: If the query execution fails or no data is found.
         """
-        all_results = []
-        last_cursor = None
+        execute = self.execute_graphql_query if retries else self._execute_graphql_query
+        results = PaginationQueryResult()
+
+        while True:
+            _limit_page_size(results, variables, max_items)
+            try:
+                result = execute(query=query, variables=variables)
+            except Exception as e:
+                logging.error(f"An error occurred during the GraphQL query execution: {e}")
+                raise GraphQLQueryException(f"An error occurred during the GraphQL query execution: {e}") from e
+            if not _add_page(results, result, variables, max_items):
+                break
+
+        return results
+
+    def iter_gql_pages(self, query: str, variables: Dict[str, Any]) -> Iterator[List[Dict[str, Any]]]:
+        """
+        Paginates over a GraphQL query, yielding the nodes of each page as it arrives.
+
+        Unlike `paginate_gql_query` the nodes are not collected, so only one page is held at a time.
 
+        :param query: The GraphQL query string that includes pagination.
+        :param variables: Initial variables for the query, typically includes 'first' and optionally 'after'.
+        :return: An iterator over the nodes of each page.
+        :raises GraphQLQueryException: If the query execution fails or no data is found.
+        """
         while True:
             try:
-                # Execute the query.
                 result = self.execute_graphql_query(query=query, variables=variables)
-                query_name = next(iter(result))
-                data = result.get(query_name)
-                if not data:
-                    raise GraphQLQueryException(f"No data found for query: {query_name}")
-
-                # Extract the edges and last cursor form current page.
-                edges = data.get('edges')
-                if edges:
-                    all_results.extend(data['edges'])
-                    last_cursor = data['edges'][-1]['cursor']
-
-                # Check if there is a next page.
-                if not data['pageInfo']['hasNextPage']:
-                    break
-
-                # Update variables for the next page.
-                variables['after'] = last_cursor
-
-            except GraphQLQueryException:
-                raise
             except Exception as e:
                 logging.error(f"An error occurred during the GraphQL query execution: {e}")
-                raise GraphQLQueryException(f"An error occurred during the GraphQL query execution: {e}")
+                raise GraphQLQueryException(f"An error occurred during the GraphQL query execution: {e}") from e
+
+            query_name = next(iter(result))
+            data = result.get(query_name)
+            if not data:
+                raise GraphQLQueryException(f"No data found for query: {query_name}")
 
-        return PaginationQueryResult(edges=all_results)
+            edges = data.get('edges') or []
+            if edges:
+                yield [edge['node'] for edge in edges]
+            if not data['pageInfo']['hasNextPage'] or not edges:
+                return
+            variables['after'] = edges[-1]['cursor']
 
     def __enter__(self):
         """Enable use of 'with' statement."""
@@ -139,3 +354,105 @@ class GraphQLClient:
     def __exit__(self, exc_type, exc_value, traceback):
         """Ensure the client is properly closed."""
         self.client.transport.close()
+
+
+class AsyncGraphQLClient:
+    """
+    An asynchronous client to interact with a GraphQL API.
+
+    Unlike GraphQLClient, which runs a new event loop for every call to `Client.execute`, this client keeps
+    one async session open for its lifetime, so queries from several synchronizers can run concurrently
+    on the same event loop and connection pool. Use it as an async context manager.
+
+    Attributes:
+        api_endpoint (str): The endpoint URL of the GraphQL API.
+        api_key (str): The API key for authentication.
+        client (Client): The gql Client instance for executing queries.
+        session: The open gql async session, set while the client is entered.
+    """
+
+    def __init__(self, api_endpoint: str, api_key: str, compress_responses: bool = True, transport: AsyncTransport = None):
+        """
+        Initializes the AsyncGraphQLClient with the given API endpoint and API key.
+
+        :param api_endpoint: The endpoint URL of the GraphQL API.
+        :param api_key: The API key for authentication.
+        :param compress_responses: Whether to request compressed responses.
+        :param transport: Optional transport to use instead of the default one, e.g. for recording or replay.
+        """
+        self.api_endpoint = api_endpoint
+        self.api_key = api_key
+        self.compress_responses = compress_responses
+        self.transport = transport
+        self.client = self._create_client()
+        self.prepared_queries = PreparedQueries()
+        self.session = None
+
+    def _create_client(self) -> Client:
+        """
+        Creates and returns a gql Client instance configured with the API endpoint and key.
+
+        :return: A configured gql Client instance.
+        """
+        transport = self.transport or create_transport(self.api_endpoint, self.api_key, self.compress_responses)
+        return Client(transport=transport, fetch_schema_from_transport=True, execute_timeout=60)
+
+    @_retry
+    async def execute_graphql_query(self, query: str, variables: Dict[str, Any] = None) -> Dict[str, Any]:
+        """
+        Executes a GraphQL query on the open session and returns the result, retrying failed requests.
+
+        :param query: The GraphQL query string.
+        :param variables: A dictionary of variables to be passed with the query.
+        :return: A dictionary representing the query result.
+        :raises GraphQLQueryException: If an error occurs during query execution.
+        """
+        return await self._execute_graphql_query(query, variables)
+
+    async def _execute_graphql_query(self, query: str, variables: Dict[str, Any] = None) -> Dict[str, Any]:
+        if self.session is None:
+            raise GraphQLQueryException("The client must be entered with 'async with' before executing queries.")
+
+        try:
+            logging.debug(f"Executing GraphQL query: {query} with variables: {variables}")
+            return await self.prepared_queries.execute(self.session, query, variables)
+        except Exception as e:
+            logging.error(f"An error occurred: {str(e)}")
+            raise GraphQLQueryException(f"An error occurred: {str(e)}") from e
+
+    async def paginate_gql_query(self, query: str, variables: Dict[str, Any], max_items: int = None,
+                                 retries: bool = True) -> PaginationQueryResult:
+        """
+        Fetches all data by paginating over a GraphQL query.
+
+        :param query: The GraphQL query string that includes pagination.
+        :param variables: Initial variables for the query, typically includes 'first' and optionally 'after'.
+        :param max_items: Optional upper bound on the number of edges to fetch.
+        :param retries: Whether failed requests are retried.
+        :return: A PaginationQueryResult containing all fetched items and the last cursor.
+        :raises GraphQLQueryException: If the query execution fails or no data is found.
+        """
+        execute = self.execute_graphql_query if retries else self._execute_graphql_query
+        results = PaginationQueryResult()
+
+        while True:
+            _limit_page_size(results, variables, max_items)
+            try:
+                result = await execute(query=query, variables=variables)
+            except Exception as e:
+                logging.error(f"An error occurred during the GraphQL query execution: {e}")
+                raise GraphQLQueryException(f"An error occurred during the GraphQL query execution: {e}") from e
+            if not _add_page(results, result, variables, max_items):
+                break
+
+        return results
+
+    async def __aenter__(self):
+        """Open the async session."""
+        self.session = await self.client.connect_async()
+        return self
+
+    async def __aexit__(self, exc_type, exc_value, traceback):
+        """Ensure the session is properly closed."""
+        await self.client.close_async()
+        self.session = None
@@ -0,0 +1,156 @@
+import asyncio
+import gzip
+import hashlib
+import json
+import logging
+import os
+import time
+from collections import defaultdict, deque
+from typing import Any, Deque, Dict
+from gql import GraphQLRequest
+from gql.transport.async_transport import AsyncTransport
+from graphql import ExecutionResult, print_ast
+from shared.gql_client import GraphQLQueryException, create_transport
+
+
+def _request_key(query: str, variables: Dict[str, Any], operation_name: str) -> str:
+    """
+    Build a stable key for a request from its query string, variables and operation name.
+
+    :param query: The printed query.
+    :param variables: The query variables.
+    :param operation_name: The operation name.
+    :return: A hex digest identifying the request.
+    """
+    serialized = json.dumps({"query": query, "variables": variables, "operation_name": operation_name},
+                            sort_keys=True, default=str)
+    return hashlib.sha256(serialized.encode('utf-8')).hexdigest()
+
+
+class RecordingTransport(AsyncTransport):
+    """
+    Transport wrapper that records every request/response pair to gzip-compressed JSON files.
+
+    Each request is written to `<directory>/<sequence>.json.gz` together with the latency of the
+    wrapped transport, so a real synchronization can later be served offline by ReplayTransport.
+    """
+
+    def __init__(self, transport: AsyncTransport, directory: str) -> None:
+        """
+        Initialize the RecordingTransport.
+
+        :param transport: The transport that performs the actual requests.
+        :param directory: The directory recordings are written to.
+        """
+        self.transport = transport
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+        # Continue numbering after earlier recordings in the same directory.
+        self._sequence = sum(1 for name in os.listdir(directory) if name.endswith('.json.gz'))
+
+    async def connect(self):
+        await self.transport.connect()
+
+    async def close(self):
+        await self.transport.close()
+
+    async def execute(self, request: GraphQLRequest, **kwargs) -> ExecutionResult:
+        start = time.perf_counter()
+        result = await self.transport.execute(request, **kwargs)
+        latency = time.perf_counter() - start
+
+        query = print_ast(request.document)
+        recording = {
+            "key": _request_key(query, request.variable_values, request.operation_name),
+            "query": query,
+            "variables": request.variable_values,
+            "operation_name": request.operation_name,
+            "latency": latency,
+            "data": result.data,
+            "errors": result.errors,
+            "extensions": result.extensions,
+        }
+        file_path = os.path.join(self.directory, f"{self._sequence:06d}.json.gz")
+        with gzip.open(file_path, 'wt', encoding='utf-8') as f:
+            json.dump(recording, f, default=str)
+        self._sequence += 1
+
+        logging.debug(f"Recorded GraphQL request to '{file_path}'.")
+        return result
+
+    def subscribe(self, request: GraphQLRequest):
+        raise NotImplementedError("Subscriptions are not supported by the recording transport.")
+
+
+class ReplayTransport(AsyncTransport):
+    """
+    Transport that serves responses recorded by RecordingTransport.
+
+    Requests are matched on their query, variables and operation name. Identical requests are
+    served in recorded order, so a replayed synchronization sees exactly the pages of the recorded
+    one. Latencies are replayed as recorded, multiplied by `latency_scale`.
+    """
+
+    def __init__(self, directory: str, latency_scale: float = 1.0) -> None:
+        """
+        Initialize the ReplayTransport.
+
+        :param directory: The directory holding the recordings.
+        :param latency_scale: Factor applied to the recorded latencies, 0 disables waiting.
+        """
+        self.directory = directory
+        self.latency_scale = latency_scale
+        self._recordings: Dict[str, Deque[Dict[str, Any]]] = defaultdict(deque)
+        self._load()
+
+    def _load(self) -> None:
+        file_names = sorted(name for name in os.listdir(self.directory) if name.endswith('.json.gz'))
+        for file_name in file_names:
+            with gzip.open(os.path.join(self.directory, file_name), 'rt', encoding='utf-8') as f:
+                recording = json.load(f)
+            self._recordings[recording["key"]].append(recording)
+        logging.info(f"Loaded {len(file_names)} recorded GraphQL requests from '{self.directory}'.")
+
+    async def connect(self):
+        pass
+
+    async def close(self):
+        pass
+
+    async def execute(self, request: GraphQLRequest, **kwargs) -> ExecutionResult:
+        key = _request_key(print_ast(request.document), request.variable_values, request.operation_name)
+        recordings = self._recordings.get(key)
+        if not recordings:
+            raise GraphQLQueryException(f"No recorded response for request with variables: {request.variable_values}")
+
+        # Keep the last recording around so repeated identical requests can still be served.
+        recording = recordings.popleft() if len(recordings) > 1 else recordings[0]
+        if self.latency_scale:
+            await asyncio.sleep(recording["latency"] * self.latency_scale)
+
+        return ExecutionResult(data=recording["data"], errors=recording["errors"], extensions=recording["extensions"])
+
+    def subscribe(self, request: GraphQLRequest):
+        raise NotImplementedError("Subscriptions are not supported by the replay transport.")
+
+
+def create_transport_from_environment(api_endpoint: str, api_key: str) -> AsyncTransport:
+    """
+    Create a recording transport when requested through app settings.
+
+    `GraphQLRecordDirectory` records the requests of a real synchronization. Replaying is deliberately not
+    available through app settings: a replayed run would advance the real state and write to the real lake,
+    so a ReplayTransport is only constructed by a harness that also provides its own state and writer.
+
+    :param api_endpoint: The endpoint URL of the GraphQL API.
+    :param api_key: The API key for authentication.
+    :return: The transport, or None to use the default transport.
+    """
+    if os.getenv("GraphQLReplayDirectory"):
+        raise ValueError("GraphQLReplayDirectory is not supported by the deployed functions, use ReplayTransport in a harness.")
+
+    record_directory = os.getenv("GraphQLRecordDirectory")
+    if record_directory:
+        return RecordingTransport(create_transport(api_endpoint, api_key), record_directory)
+
+    return None
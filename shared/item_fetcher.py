@@ -1,13 +1,21 @@
-from shared.gql_client import GraphQLClient, PaginationQueryResult
-from shared.utils.data_transformation import add_key_value_to_dicts
-from typing import Dict, Any, Set, List
+from shared.gql_client import GraphQLClient, AsyncGraphQLClient, PaginationQueryResult, is_query_error
+from shared.utils.data_transformation import flatten_list_of_dicts
+from shared.utils.files import convert_dicts_to_table
+from typing import Dict, Any, Iterator, Set, List, Tuple
 import logging
+import pyarrow as pa
+
+
+# A batch is only dead-lettered up to this many ids, more failures point at an outage rather than bad records.
+MAX_FAILED_IDS = 100
 
 
 class ItemsResult:
-    def __init__(self, items: list[Dict], cursor: str) -> None:
+    def __init__(self, items: list[Dict], cursor: str, failed_ids: List[Any] = None) -> None:
         self.items = items
         self.cursor = cursor
+        self.failed_ids = failed_ids or []
+        self.constant_columns = {}
 
     def has_items(self) -> bool:
         return bool(self.items)
@@ -17,34 +25,163 @@ class ItemsResult:
     
     def get_last_item_cursor(self) -> str:
         return self.cursor
+
+    def has_failed_ids(self) -> bool:
+        return bool(self.failed_ids)
+
+    def get_failed_ids(self) -> List[Any]:
+        return self.failed_ids
     
-    def add_key_value_to_items(self, key: str, value: Any) -> None:
-        add_key_value_to_dicts(self.items, key, value)
+    def set_constant_column(self, key: str, value: Any) -> None:
+        # Stored once for the whole result instead of as a key on every item.
+        self.constant_columns[key] = value
+
+    def to_table(self, explode_lists: bool = True) -> pa.Table:
+        flattened = flatten_list_of_dicts(self.items, explode_lists=explode_lists)
+        return convert_dicts_to_table(flattened, self.constant_columns)
+
+
+def _bisected_result(db_ids: List[Any], nodes: List[Dict], cursor: str, failed_ids: List[Any], error: Exception) -> ItemsResult:
+    # Once the cap is passed the rest of the batch is not tried, so the failed ids include untried ones.
+    if len(failed_ids) > MAX_FAILED_IDS:
+        logging.error(f"More than {MAX_FAILED_IDS} items in a batch of {len(db_ids)} could not be fetched, giving up on the batch.")
+        raise error
+    if len(failed_ids) == len(db_ids):
+        logging.error(f"None of the {len(db_ids)} items in the batch could be fetched, giving up on the batch.")
+        raise error
+
+    logging.warning(f"Isolated {len(failed_ids)} failing items in a batch of {len(db_ids)}: {failed_ids}")
+    return ItemsResult(nodes, cursor, failed_ids)
 
 
 class ItemFetcher:
-    def __init__(self, client: GraphQLClient, query_by_dbids: str, query_by_cursor: str) -> None:
+    def __init__(self, client: GraphQLClient, query_by_dbids: str, query_by_cursor: str, query_ids_by_cursor: str = None) -> None:
         self.graphql_client = client
         self.query_by_dbids = query_by_dbids
         self.query_by_cursor = query_by_cursor
+        self.query_ids_by_cursor = query_ids_by_cursor
 
     def fetch_items_by_ids(self, db_ids: List[str], first: int = 10000) -> ItemsResult:
+        """
+        Fetch the items with the given dbIds.
+
+        When the server returns errors for the batch, it is split in halves recursively until the failing
+        dbIds are isolated. Those are returned as failed ids and the rest of the batch is returned as usual.
+        The halves are not retried, since errors returned by the server come back the same. The error is
+        re-raised when nothing in the batch can be fetched or more than MAX_FAILED_IDS dbIds fail. Other
+        errors, e.g. connection errors during an outage, are re-raised right away without bisecting.
+
+        :param db_ids: The dbIds to fetch.
+        :param first: Page size of the query.
+        :return: The fetched items and the dbIds that could not be fetched.
+        """
         if not db_ids:
             return ItemsResult([], None)
-        
-        variables = {"first": first, "dbIdList": db_ids}
-        query_result = self._execute_paginated_query(self.query_by_dbids, variables)
 
-        return ItemsResult(query_result.get_nodes(), query_result.get_last_cursor())
+        try:
+            query_result = self._execute_paginated_query(self.query_by_dbids, {"first": first, "dbIdList": db_ids})
+            return ItemsResult(query_result.get_nodes(), query_result.get_last_cursor())
+        except Exception as e:
+            if len(db_ids) == 1 or not is_query_error(e):
+                raise
+            error = e
+
+        nodes, cursor, failed_ids = self._bisect(db_ids, first, split=True)
+        return _bisected_result(db_ids, nodes, cursor, failed_ids, error)
+
+    def _bisect(self, db_ids: List[str], first: int, split: bool = False) -> Tuple[List[Dict], str, List[Any]]:
+        if not split:
+            try:
+                variables = {"first": first, "dbIdList": db_ids}
+                query_result = self._execute_paginated_query(self.query_by_dbids, variables, retries=False)
+                return query_result.get_nodes(), query_result.get_last_cursor(), []
+            except Exception as e:
+                if not is_query_error(e):
+                    raise
+                if len(db_ids) == 1:
+                    return [], None, list(db_ids)
+
+        # Stop splitting once the batch is beyond saving.
+        middle = len(db_ids) // 2
+        nodes, cursor, failed_ids = self._bisect(db_ids[:middle], first)
+        if len(failed_ids) > MAX_FAILED_IDS:
+            return nodes, cursor, failed_ids + list(db_ids[middle:])
+        second_nodes, second_cursor, second_failed_ids = self._bisect(db_ids[middle:], first)
+        return nodes + second_nodes, second_cursor or cursor, failed_ids + second_failed_ids
 
     def fetch_all_items_after_cursor(self, after: str = None, first: int = 10000) -> ItemsResult:
         variables = {"first": first, "after": after}
         query_result = self._execute_paginated_query(self.query_by_cursor, variables)
         return ItemsResult(query_result.get_nodes(), query_result.get_last_cursor())
 
-    def _execute_paginated_query(self, query: str, variables: Dict[str, Any]) -> PaginationQueryResult:
+    def iter_id_pages(self, first: int = 10000) -> Iterator[List[str]]:
+        if not self.query_ids_by_cursor:
+            raise ValueError("No query for fetching ids has been configured.")
+
+        # Pages are handed out as they arrive, so the ids are never all held at once.
+        for page in self.graphql_client.iter_gql_pages(self.query_ids_by_cursor, {"first": first, "after": None}):
+            yield [node['dbId'] for node in page]
+
+    def iter_item_pages_after_cursor(self, after: str = None, first: int = 10000) -> Iterator[List[Dict]]:
+        # Pages are handed out as they arrive instead of being collected in an ItemsResult.
+        return self.graphql_client.iter_gql_pages(self.query_by_cursor, {"first": first, "after": after})
+
+    def _execute_paginated_query(self, query: str, variables: Dict[str, Any], retries: bool = True) -> PaginationQueryResult:
+        try:
+            return self.graphql_client.paginate_gql_query(query, variables, retries=retries)
+        except Exception as e:
+            logging.error(f"Error fetching items: {e}")
+            raise
+
+
+class AsyncItemFetcher(ItemFetcher):
+    def __init__(self, client: AsyncGraphQLClient, query_by_dbids: str, query_by_cursor: str, query_ids_by_cursor: str = None) -> None:
+        super().__init__(client, query_by_dbids, query_by_cursor, query_ids_by_cursor)
+
+    async def fetch_items_by_ids(self, db_ids: List[str], first: int = 10000) -> ItemsResult:
+        if not db_ids:
+            return ItemsResult([], None)
+
+        try:
+            query_result = await self._execute_paginated_query(self.query_by_dbids, {"first": first, "dbIdList": db_ids})
+            return ItemsResult(query_result.get_nodes(), query_result.get_last_cursor())
+        except Exception as e:
+            if len(db_ids) == 1 or not is_query_error(e):
+                raise
+            error = e
+
+        nodes, cursor, failed_ids = await self._bisect(db_ids, first, split=True)
+        return _bisected_result(db_ids, nodes, cursor, failed_ids, error)
+
+    async def _bisect(self, db_ids: List[str], first: int, split: bool = False) -> Tuple[List[Dict], str, List[Any]]:
+        if not split:
+            try:
+                variables = {"first": first, "dbIdList": db_ids}
+                query_result = await self._execute_paginated_query(self.query_by_dbids, variables, retries=False)
+                return query_result.get_nodes(), query_result.get_last_cursor(), []
+            except Exception as e:
+                if not is_query_error(e):
+                    raise
+                if len(db_ids) == 1:
+                    return [], None, list(db_ids)
+
+        # The halves are fetched one after the other, a failing batch should not multiply the load on the API.
+        # Stop splitting once the batch is beyond saving.
+        middle = len(db_ids) // 2
+        nodes, cursor, failed_ids = await self._bisect(db_ids[:middle], first)
+        if len(failed_ids) > MAX_FAILED_IDS:
+            return nodes, cursor, failed_ids + list(db_ids[middle:])
+        second_nodes, second_cursor, second_failed_ids = await self._bisect(db_ids[middle:], first)
+        return nodes + second_nodes, second_cursor or cursor, failed_ids + second_failed_ids
+
+    async def fetch_all_items_after_cursor(self, after: str = None, first: int = 10000) -> ItemsResult:
+        variables = {"first": first, "after": after}
+        query_result = await self._execute_paginated_query(self.query_by_cursor, variables)
+        return ItemsResult(query_result.get_nodes(), query_result.get_last_cursor())
+
+    async def _execute_paginated_query(self, query: str, variables: Dict[str, Any], retries: bool = True) -> PaginationQueryResult:
         try:
-            return self.graphql_client.paginate_gql_query(query, variables)
+            return await self.graphql_client.paginate_gql_query(query, variables, retries=retries)
         except Exception as e:
             logging.error(f"Error fetching items: {e}")
             raise
\ No newline at end of file
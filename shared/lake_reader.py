@@ -0,0 +1,222 @@
+import json
+import logging
+import os
+from typing import Dict, Iterator, List, Optional, Tuple
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.dataset as ds
+import pyarrow.fs as pafs
+import pyarrow.parquet as pq
+from shared.utils.files import WRITTEN_AT_KEY, convert_tables_to_parquet, write_buffer_to_file
+
+
+_ROW_INDEX = "__row_index"
+
+
+class LakeReader:
+    """
+    Materializes the current state of an entity from its change files in the data lake.
+
+    An entity directory holds Parquet files with a `mutationType` column, written in order over time.
+    The reader returns the latest row of every dbId, leaving out dbIds whose latest row is DELETED.
+    Files are ordered by the write time the synchronizer records in their metadata, falling back to the
+    modification time for files written without it, and rows within a file by position.
+
+    Resolution reads only `dbId` and `mutationType` to find which file holds the latest row of every
+    dbId. The rows themselves are then read file by file, filtered on those dbIds, so the page indexes
+    and bloom filters on dbId let Parquet skip the rest. Column projection and filters are pushed down
+    wherever that cannot change the result.
+
+    With a cache directory, the resolved state is kept locally with a manifest of the files it covers,
+    and the next read only processes files written since.
+    """
+
+    def __init__(self, filesystem: pafs.FileSystem, directory: str, cache_directory: str = None) -> None:
+        """
+        Initialize the LakeReader.
+
+        :param filesystem: The filesystem holding the entity directory.
+        :param directory: Path of the entity directory, e.g. 'filesystem/timesheets'.
+        :param cache_directory: Optional local directory for the resolved state.
+        """
+        self.filesystem = filesystem
+        self.directory = directory
+        self.cache_directory = cache_directory
+
+    @classmethod
+    def from_data_lake(cls, account_name: str, account_key: str, file_system_name: str, name: str,
+                       cache_directory: str = None) -> "LakeReader":
+        """
+        Create a reader for an entity in the Azure Data Lake.
+
+        :param account_name: Name of the storage account.
+        :param account_key: Access key of the storage account.
+        :param file_system_name: Name of the file system (container).
+        :param name: Name of the entity.
+        :param cache_directory: Optional local directory for the resolved state.
+        :return: The reader.
+        """
+        filesystem = pafs.AzureFileSystem(account_name=account_name, account_key=account_key)
+        return cls(filesystem, f"{file_system_name}/{name}", cache_directory)
+
+    def read(self, columns: List[str] = None, filter: pc.Expression = None) -> pa.Table:
+        """
+        Read the current state into a table.
+
+        :param columns: Columns to return, all columns if None. dbId is always included.
+        :param filter: Optional filter expression on the current rows.
+        :return: The current rows.
+        """
+        tables = [pa.Table.from_batches([batch]) for batch in self.iter_batches(columns, filter)]
+        if not tables:
+            return pa.table({})
+        return pa.concat_tables(tables, promote_options="permissive")
+
+    def iter_batches(self, columns: List[str] = None, filter: pc.Expression = None,
+                     batch_size: int = 65536) -> Iterator[pa.RecordBatch]:
+        """
+        Stream the current state in record batches, holding at most one file's worth of rows in memory.
+
+        Batches from different files may have different schemas when the files do.
+
+        :param columns: Columns to return, all columns if None. dbId is always included.
+        :param filter: Optional filter expression on the current rows.
+        :param batch_size: Maximum number of rows per batch.
+        :return: An iterator over the current rows.
+        """
+        if self.cache_directory:
+            self.refresh_cache()
+            state_path = os.path.join(self.cache_directory, "state.parquet")
+            if not os.path.exists(state_path):
+                return
+            dataset = ds.dataset(state_path, format="parquet")
+            yield from dataset.to_batches(columns=_project(dataset.schema, columns), filter=filter, batch_size=batch_size)
+            return
+
+        files = self._list_files()
+        latest, duplicated = self._resolve(files)
+        yield from self._read_latest_rows(files, latest, duplicated, columns, filter, batch_size)
+
+    def refresh_cache(self) -> None:
+        """
+        Bring the locally cached state up to date with the files written since the last refresh.
+        """
+        os.makedirs(self.cache_directory, exist_ok=True)
+        manifest_path = os.path.join(self.cache_directory, "manifest.json")
+        state_path = os.path.join(self.cache_directory, "state.parquet")
+
+        processed = {}
+        rebuild = False
+        if os.path.exists(manifest_path):
+            with open(manifest_path) as f:
+                processed = json.load(f)["files"]
+            # Older manifests only list the paths, without modification times to compare with.
+            if isinstance(processed, list):
+                processed, rebuild = {}, True
+
+        # Files are overwritten when a window is retried, so a changed modification time counts as new.
+        infos = self._list_file_infos()
+        files = {info.path: info.mtime_ns for info in infos}
+        new_files = self._in_write_order([info for info in infos if processed.get(info.path) != info.mtime_ns])
+        if not new_files and not rebuild:
+            return
+
+        # The earlier version of an overwritten file may hold dbIds the new version lacks. Their rows in the
+        # cached state are then stale, and only a resolution over every file finds their latest rows.
+        if rebuild or any(path in processed for path in new_files):
+            logging.info(f"Rebuilding the cached state of {self.directory} from all files.")
+            new_files, rebuild = self._in_write_order(infos), True
+        else:
+            logging.info(f"Applying {len(new_files)} new files from {self.directory} to the cached state.")
+        latest, duplicated = self._resolve(new_files)
+        new_rows = [pa.Table.from_batches([batch]) for batch in self._read_latest_rows(new_files, latest, duplicated)]
+
+        # Rows of dbIds changed by the new files, deleted ones included, are replaced.
+        tables = []
+        if os.path.exists(state_path) and not rebuild:
+            cached = pq.read_table(state_path)
+            changed_ids = pa.array(list(latest.keys()), type=cached.schema.field("dbId").type)
+            tables.append(cached.filter(pc.invert(pc.is_in(cached["dbId"], value_set=changed_ids))))
+        tables.extend(new_rows)
+        tables = [table for table in tables if table.num_rows]
+
+        if tables:
+            write_buffer_to_file(convert_tables_to_parquet(tables, sort_key="dbId"), state_path)
+        elif os.path.exists(state_path):
+            os.remove(state_path)
+        with open(manifest_path, "w") as f:
+            json.dump({"files": files}, f)
+
+    def _list_files(self) -> List[str]:
+        return self._in_write_order(self._list_file_infos())
+
+    def _list_file_infos(self) -> List[pafs.FileInfo]:
+        # Only the files directly in the entity directory, not the synchronizer's _state.
+        infos = self.filesystem.get_file_info(pafs.FileSelector(self.directory, recursive=False))
+        return [info for info in infos if info.type == pafs.FileType.File and info.base_name.endswith(".parquet")]
+
+    def _in_write_order(self, infos: List[pafs.FileInfo]) -> List[str]:
+        # The lake keeps modification times to the second and the file names are digests, so neither
+        # orders two files written within the same second. Only the footers are read.
+        def write_order(info: pafs.FileInfo) -> Tuple[int, str]:
+            metadata = pq.read_schema(info.path, filesystem=self.filesystem).metadata or {}
+            written_at = metadata.get(WRITTEN_AT_KEY.encode())
+            return (int(written_at) if written_at else info.mtime_ns), info.base_name
+
+        return [info.path for info in sorted(infos, key=write_order)]
+
+    def _resolve(self, files: List[str]) -> Tuple[Dict[int, Tuple[int, bool]], set]:
+        """
+        Find the file holding the latest row of every dbId.
+
+        :param files: The files in write order.
+        :return: dbIds mapped to the index of that file and whether the row is a deletion, and the
+                 indexes of files holding more than one row for a dbId.
+        """
+        latest = {}
+        duplicated = set()
+        for file_index, path in enumerate(files):
+            table = pq.read_table(path, columns=["dbId", "mutationType"], filesystem=self.filesystem)
+            db_ids = table["dbId"].to_pylist()
+            if len(set(db_ids)) < len(db_ids):
+                duplicated.add(file_index)
+            # Later rows overwrite earlier ones, also within a file.
+            for db_id, mutation_type in zip(db_ids, table["mutationType"].to_pylist()):
+                latest[db_id] = (file_index, mutation_type == "DELETED")
+        return latest, duplicated
+
+    def _read_latest_rows(self, files: List[str], latest: Dict[int, Tuple[int, bool]], duplicated: set,
+                          columns: List[str] = None, filter: pc.Expression = None,
+                          batch_size: int = 65536) -> Iterator[pa.RecordBatch]:
+        ids_per_file: Dict[int, List] = {}
+        for db_id, (file_index, deleted) in latest.items():
+            if not deleted:
+                ids_per_file.setdefault(file_index, []).append(db_id)
+
+        for file_index, db_ids in sorted(ids_per_file.items()):
+            dataset = ds.dataset(files[file_index], format="parquet", filesystem=self.filesystem)
+            value_set = pa.array(db_ids, type=dataset.schema.field("dbId").type)
+            selection = pc.field("dbId").isin(value_set)
+
+            if file_index not in duplicated:
+                # Every selected row is a latest row, so the filter can be pushed down as well.
+                if filter is not None:
+                    selection = selection & filter
+                yield from dataset.to_batches(columns=_project(dataset.schema, columns), filter=selection, batch_size=batch_size)
+                continue
+
+            # Keep the last row of every dbId before applying the filter.
+            table = dataset.to_table(columns=_project(dataset.schema, columns), filter=selection)
+            table = table.append_column(_ROW_INDEX, pa.array(range(table.num_rows), type=pa.int64()))
+            last_rows = table.group_by("dbId").aggregate([(_ROW_INDEX, "max")])[f"{_ROW_INDEX}_max"]
+            table = table.take(last_rows).drop_columns([_ROW_INDEX])
+            if filter is not None:
+                table = table.filter(filter)
+            yield from table.to_batches(max_chunksize=batch_size)
+
+
+def _project(schema: pa.Schema, columns: Optional[List[str]]) -> Optional[List[str]]:
+    # Columns a file does not have are left out, they come back as nulls when the tables are combined.
+    if columns is None:
+        return None
+    return ["dbId"] + [name for name in columns if name in schema.names and name != "dbId"]
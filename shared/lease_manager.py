@@ -0,0 +1,237 @@
+import asyncio
+import logging
+import threading
+import time
+from azure.core.exceptions import HttpResponseError
+from azure.storage.filedatalake import DataLakeLeaseClient
+from azure.storage.filedatalake.aio import DataLakeLeaseClient as AsyncDataLakeLeaseClient
+from shared.data_lake_writer import DataLakeWriter, AsyncDataLakeWriter
+
+
+LEASE_DIRECTORY = "_leases"
+
+
+class LeaseLostException(Exception):
+    """Raised when work is about to be written under a lease that is no longer held."""
+    pass
+
+
+class DataLakeLease:
+    """
+    Coordinates instances of the function app through a lease on a lock file in the data lake.
+
+    Every instance runs every timer, so without coordination two instances can synchronize the same
+    entity at once and race on its state. A unit of work (an entity, or a partition of one) is only
+    worked on by the instance holding the lease on `_leases/<unit>.lock`. Other instances skip the unit,
+    which leaves them free to pick up units nobody holds. The lease is held for a short duration and
+    renewed in the background, so the lease of a crashed instance expires on its own.
+
+    Use it as a context manager and check `acquired` before doing the work. Call `ensure_held` before every
+    write, so an instance that lost its lease stops instead of racing the instance that took it over.
+    """
+
+    def __init__(self, data_lake_writer: DataLakeWriter, file_system_name: str, unit_name: str,
+                 lease_duration: int = 60, renew_interval: int = 20) -> None:
+        """
+        Initialize the DataLakeLease.
+
+        :param data_lake_writer: Writer used to create the lock file.
+        :param file_system_name: Name of the file system (container) holding the lock file.
+        :param unit_name: Name of the unit of work, e.g. the entity name.
+        :param lease_duration: Lease duration in seconds, between 15 and 60.
+        :param renew_interval: Seconds between lease renewals, well below the lease duration.
+        """
+        self.data_lake_writer = data_lake_writer
+        self.file_system_name = file_system_name
+        self.unit_name = unit_name
+        self.lease_duration = lease_duration
+        self.renew_interval = renew_interval
+        self.acquired = False
+        self.lost = False
+        self._renewed_at = None
+        self._lease_client = None
+        self._stop_renewing = threading.Event()
+        self._renew_thread = None
+
+    def acquire(self) -> bool:
+        """
+        Try to acquire the lease without waiting.
+
+        :return: True if the lease was acquired, False if another instance holds it.
+        """
+        file_client = self.data_lake_writer.ensure_file_exists(self.file_system_name, LEASE_DIRECTORY, f"{self.unit_name}.lock")
+        self._lease_client = DataLakeLeaseClient(file_client)
+        requested_at = time.monotonic()
+        try:
+            self._lease_client.acquire(lease_duration=self.lease_duration)
+        except HttpResponseError as e:
+            if e.status_code == 409:  # Lease already present
+                logging.info(f"Lease for '{self.unit_name}' is held by another instance.")
+                return False
+            logging.error(f"Failed to acquire lease for '{self.unit_name}': {e}")
+            raise
+
+        self.acquired = True
+        self._renewed_at = requested_at
+        self._stop_renewing.clear()
+        self._renew_thread = threading.Thread(target=self._renew, daemon=True)
+        self._renew_thread.start()
+        logging.info(f"Acquired lease for '{self.unit_name}'.")
+        return True
+
+    def _renew(self) -> None:
+        while not self._stop_renewing.wait(self.renew_interval):
+            # The lease runs from the request, not the response.
+            requested_at = time.monotonic()
+            try:
+                self._lease_client.renew()
+                self._renewed_at = requested_at
+            except HttpResponseError as e:
+                self.lost = True
+                logging.error(f"Lost lease for '{self.unit_name}': {e}")
+                return
+
+    def ensure_held(self) -> None:
+        """
+        Check that the lease is still held, before writing to the lake or saving state.
+
+        A lease counts as lost when a renewal failed, and also when the last successful renewal is older
+        than the lease duration, since another instance may have acquired it in the meantime.
+
+        :raises LeaseLostException: If the lease is not held.
+        """
+        if not self.acquired:
+            raise LeaseLostException(f"Lease for '{self.unit_name}' is not held.")
+        if self.lost or time.monotonic() - self._renewed_at >= self.lease_duration:
+            raise LeaseLostException(f"Lease for '{self.unit_name}' was lost.")
+
+    def release(self) -> None:
+        """
+        Stop renewing and release the lease.
+        """
+        if not self.acquired:
+            return
+
+        self._stop_renewing.set()
+        self._renew_thread.join()
+        self.acquired = False
+        try:
+            self._lease_client.release()
+            logging.info(f"Released lease for '{self.unit_name}'.")
+        except HttpResponseError as e:
+            logging.warning(f"Failed to release lease for '{self.unit_name}', it will expire: {e}")
+
+    def __enter__(self):
+        self.acquire()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.release()
+
+
+class AsyncDataLakeLease:
+    """
+    Asynchronous counterpart of DataLakeLease, renewing the lease from a task on the event loop.
+
+    Use it as an async context manager, check `acquired` before doing the work and `ensure_held` before
+    every write.
+    """
+
+    def __init__(self, data_lake_writer: AsyncDataLakeWriter, file_system_name: str, unit_name: str,
+                 lease_duration: int = 60, renew_interval: int = 20) -> None:
+        """
+        Initialize the AsyncDataLakeLease.
+
+        :param data_lake_writer: Writer used to create the lock file.
+        :param file_system_name: Name of the file system (container) holding the lock file.
+        :param unit_name: Name of the unit of work, e.g. the entity name.
+        :param lease_duration: Lease duration in seconds, between 15 and 60.
+        :param renew_interval: Seconds between lease renewals, well below the lease duration.
+        """
+        self.data_lake_writer = data_lake_writer
+        self.file_system_name = file_system_name
+        self.unit_name = unit_name
+        self.lease_duration = lease_duration
+        self.renew_interval = renew_interval
+        self.acquired = False
+        self.lost = False
+        self._renewed_at = None
+        self._lease_client = None
+        self._renew_task = None
+
+    async def acquire(self) -> bool:
+        """
+        Try to acquire the lease without waiting.
+
+        :return: True if the lease was acquired, False if another instance holds it.
+        """
+        file_client = await self.data_lake_writer.ensure_file_exists(self.file_system_name, LEASE_DIRECTORY, f"{self.unit_name}.lock")
+        self._lease_client = AsyncDataLakeLeaseClient(file_client)
+        requested_at = time.monotonic()
+        try:
+            await self._lease_client.acquire(lease_duration=self.lease_duration)
+        except HttpResponseError as e:
+            if e.status_code == 409:  # Lease already present
+                logging.info(f"Lease for '{self.unit_name}' is held by another instance.")
+                return False
+            logging.error(f"Failed to acquire lease for '{self.unit_name}': {e}")
+            raise
+
+        self.acquired = True
+        self._renewed_at = requested_at
+        self._renew_task = asyncio.create_task(self._renew())
+        logging.info(f"Acquired lease for '{self.unit_name}'.")
+        return True
+
+    async def _renew(self) -> None:
+        while True:
+            await asyncio.sleep(self.renew_interval)
+            # The lease runs from the request, not the response.
+            requested_at = time.monotonic()
+            try:
+                await self._lease_client.renew()
+                self._renewed_at = requested_at
+            except HttpResponseError as e:
+                self.lost = True
+                logging.error(f"Lost lease for '{self.unit_name}': {e}")
+                return
+
+    def ensure_held(self) -> None:
+        """
+        Check that the lease is still held, before writing to the lake or saving state.
+
+        A lease counts as lost when a renewal failed, and also when the last successful renewal is older
+        than the lease duration, since another instance may have acquired it in the meantime.
+
+        :raises LeaseLostException: If the lease is not held.
+        """
+        if not self.acquired:
+            raise LeaseLostException(f"Lease for '{self.unit_name}' is not held.")
+        if self.lost or time.monotonic() - self._renewed_at >= self.lease_duration:
+            raise LeaseLostException(f"Lease for '{self.unit_name}' was lost.")
+
+    async def release(self) -> None:
+        """
+        Stop renewing and release the lease.
+        """
+        if not self.acquired:
+            return
+
+        self._renew_task.cancel()
+        try:
+            await self._renew_task
+        except asyncio.CancelledError:
+            pass
+        self.acquired = False
+        try:
+            await self._lease_client.release()
+            logging.info(f"Released lease for '{self.unit_name}'.")
+        except HttpResponseError as e:
+            logging.warning(f"Failed to release lease for '{self.unit_name}', it will expire: {e}")
+
+    async def __aenter__(self):
+        await self.acquire()
+        return self
+
+    async def __aexit__(self, exc_type, exc_value, traceback):
+        await self.release()
@@ -0,0 +1,173 @@
+import cProfile
+import io
+import json
+import logging
+import marshal
+import os
+import random
+import time
+import tracemalloc
+from contextlib import contextmanager
+from shared.data_lake_writer import DataLakeWriter
+from shared.utils.time import get_current_time_for_filename
+
+
+PROFILE_DIRECTORY = "_profiles"
+
+
+class RunProfiler:
+    """
+    Profiles one syncronization run with cProfile and/or tracemalloc.
+
+    Wrap the run in the profiler as a context manager and mark the pipeline stages with `stage`.
+    Wall time, and with memory profiling the allocated and peak traced memory, are attributed to
+    each stage. When the run ends the artefacts are written to `<entity>/_profiles/` in the lake:
+    `<time>-<entity>.prof` (open with `pstats.Stats`), `<time>-<entity>-memory.txt` with the top allocation
+    sites, and `<time>-<entity>-stages.json`.
+
+    A profiler that is not enabled, or that was not sampled for this run, does nothing.
+    """
+
+    def __init__(self, name: str, data_lake_writer: DataLakeWriter = None, cpu: bool = False, memory: bool = False,
+                 sample_rate: float = 1.0, traceback_frames: int = 1, top_allocations: int = 50) -> None:
+        """
+        Initialize the RunProfiler.
+
+        :param name: Name of the entity being syncronized.
+        :param data_lake_writer: Writer used to store the artefacts.
+        :param cpu: Profile the run with cProfile.
+        :param memory: Trace allocations with tracemalloc.
+        :param sample_rate: Fraction of runs that are profiled, between 0 and 1.
+        :param traceback_frames: Number of frames tracemalloc stores per allocation, more frames cost more.
+        :param top_allocations: Number of allocation sites written to the memory report.
+        """
+        self.name = name
+        self.data_lake_writer = data_lake_writer
+        self.cpu = cpu
+        self.memory = memory
+        self.sample_rate = sample_rate
+        self.traceback_frames = traceback_frames
+        self.top_allocations = top_allocations
+        self.active = False
+        self.stages = {}
+        self._profile = None
+        self._started_tracing = False
+
+    @classmethod
+    def from_environment(cls, name: str, data_lake_writer: DataLakeWriter) -> "RunProfiler":
+        """
+        Create a profiler from the app settings, so profiling can be switched on without a deployment.
+
+        `Profiling` lists the modes, e.g. `cpu,memory`. `ProfilingEntities` optionally limits profiling to
+        a comma separated list of entities. `ProfilingSampleRate` and `ProfilingTracebackFrames` tune the
+        overhead.
+
+        :param name: Name of the entity being syncronized.
+        :param data_lake_writer: Writer used to store the artefacts.
+        :return: The profiler, disabled unless the settings enable it for the entity.
+        """
+        modes = {mode.strip() for mode in os.getenv("Profiling", "").lower().split(",") if mode.strip()}
+        entities = {entity.strip() for entity in os.getenv("ProfilingEntities", "").split(",") if entity.strip()}
+        if entities and name not in entities:
+            modes = set()
+
+        return cls(
+            name,
+            data_lake_writer,
+            cpu="cpu" in modes,
+            memory="memory" in modes,
+            sample_rate=float(os.getenv("ProfilingSampleRate", "1.0")),
+            traceback_frames=int(os.getenv("ProfilingTracebackFrames", "1"))
+        )
+
+    def start(self) -> None:
+        """
+        Start profiling if enabled and sampled for this run.
+        """
+        self.stages = {}
+        self.active = (self.cpu or self.memory) and random.random() < self.sample_rate
+        if not self.active:
+            return
+
+        logging.info(f"Profiling run of {self.name} (cpu: {self.cpu}, memory: {self.memory}).")
+        if self.memory and not tracemalloc.is_tracing():
+            tracemalloc.start(self.traceback_frames)
+            self._started_tracing = True
+        if self.cpu:
+            self._profile = cProfile.Profile()
+            self._profile.enable()
+
+    def stop(self) -> None:
+        """
+        Stop profiling and write the artefacts to the data lake.
+        """
+        if not self.active:
+            return
+        self.active = False
+
+        prefix = f"{get_current_time_for_filename()}-{self.name}"
+        directory = f"{self.name}/{PROFILE_DIRECTORY}"
+        try:
+            if self._profile:
+                self._profile.disable()
+                self._profile.create_stats()
+                self._write(directory, f"{prefix}.prof", io.BytesIO(marshal.dumps(self._profile.stats)))
+                self._profile = None
+
+            if self.memory and tracemalloc.is_tracing():
+                self._write(directory, f"{prefix}-memory.txt", self._memory_report())
+
+            self._write(directory, f"{prefix}-stages.json", json.dumps(self.stages, indent=2))
+        finally:
+            if self._started_tracing:
+                tracemalloc.stop()
+                self._started_tracing = False
+
+    def _memory_report(self) -> str:
+        snapshot = tracemalloc.take_snapshot()
+        current, peak = tracemalloc.get_traced_memory()
+        lines = [f"Current traced memory: {current} B, peak: {peak} B", ""]
+        lines.extend(str(statistic) for statistic in snapshot.statistics("lineno")[:self.top_allocations])
+        return "\n".join(lines)
+
+    def _write(self, directory: str, file_name: str, data) -> None:
+        # Losing a profile must never fail the syncronization.
+        try:
+            self.data_lake_writer.write_data("filesystem", directory, file_name, data)
+        except Exception as e:
+            logging.error(f"Failed to write profile {file_name} of {self.name}: {e}")
+
+    @contextmanager
+    def stage(self, stage_name: str):
+        """
+        Attribute the time and memory of a block to a pipeline stage. Repeated stages are summed.
+
+        :param stage_name: Name of the stage, e.g. 'fetch_items'.
+        """
+        if not self.active:
+            yield
+            return
+
+        tracing = self.memory and tracemalloc.is_tracing()
+        if tracing:
+            allocated_before = tracemalloc.get_traced_memory()[0]
+            tracemalloc.reset_peak()
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            stage = self.stages.setdefault(stage_name, {"calls": 0, "seconds": 0.0})
+            stage["calls"] += 1
+            stage["seconds"] += time.perf_counter() - started
+            if tracing:
+                allocated, peak = tracemalloc.get_traced_memory()
+                stage["allocated_bytes"] = stage.get("allocated_bytes", 0) + allocated - allocated_before
+                stage["peak_bytes"] = max(stage.get("peak_bytes", 0), peak - allocated_before)
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.stop()
+
@@ -0,0 +1,127 @@
+import logging
+from io import BytesIO
+from typing import Any, Callable, Dict, Iterable, List, Tuple
+import pyarrow as pa
+import pyarrow.parquet as pq
+from shared.data_lake_writer import DataLakeWriter
+
+
+class IncrementalRollup:
+    """
+    Maintains a summed measure grouped by a set of dimensions while synchronizing.
+
+    Each run's ADDED, UPDATED and DELETED items are applied as deltas instead of rescanning the
+    history. The contribution of every dbId (its group key and value) is kept, so an update first
+    retracts the previous contribution and a deletion retracts it entirely. The contributions are
+    persisted in the entity's `_state` directory and the aggregate table is written to
+    `<entity>_rollups/<name>.parquet` for analytics.
+    """
+
+    def __init__(self, name: str, data_lake_writer: DataLakeWriter, file_system_name: str, entity_name: str,
+                 dimensions: List[str], key_function: Callable[[Dict[str, Any]], Tuple], measure: str,
+                 value_function: Callable[[Dict[str, Any]], float]) -> None:
+        """
+        Initialize the IncrementalRollup.
+
+        :param name: Name of the rollup, used for its files.
+        :param data_lake_writer: Writer used to load and persist the rollup.
+        :param file_system_name: Name of the file system (container).
+        :param entity_name: Name of the entity the rollup is maintained for.
+        :param dimensions: Column names of the group key.
+        :param key_function: Returns the group key of an item, one value per dimension.
+        :param measure: Column name of the summed measure.
+        :param value_function: Returns the value of the measure for an item.
+        """
+        self.name = name
+        self.data_lake_writer = data_lake_writer
+        self.file_system_name = file_system_name
+        self.state_directory = f"{entity_name}/_state"
+        self.output_directory = f"{entity_name}_rollups"
+        self.dimensions = dimensions
+        self.key_function = key_function
+        self.measure = measure
+        self.value_function = value_function
+        self.contributions: Dict[int, Tuple[Tuple, float]] = {}
+        self.aggregates: Dict[Tuple, List] = {}
+
+    def load(self) -> None:
+        """
+        Load the contributions from the data lake and rebuild the aggregates from them.
+        """
+        self.contributions = {}
+        self.aggregates = {}
+        data = self.data_lake_writer.read_data(self.file_system_name, self.state_directory, f"{self.name}_contributions.parquet")
+        if data is None:
+            return
+
+        columns = pq.read_table(BytesIO(data)).to_pydict()
+        keys = zip(*(columns[dimension] for dimension in self.dimensions))
+        for db_id, key, value in zip(columns['dbId'], keys, columns[self.measure]):
+            self._add(db_id, key, value)
+        logging.info(f"Loaded rollup '{self.name}' with {len(self.contributions)} contributions.")
+
+    def save(self) -> None:
+        """
+        Persist the contributions and write the aggregate table.
+        """
+        db_ids = list(self.contributions.keys())
+        contributions = {'dbId': pa.array(db_ids, type=pa.int64())}
+        for index, dimension in enumerate(self.dimensions):
+            contributions[dimension] = [self.contributions[db_id][0][index] for db_id in db_ids]
+        contributions[self.measure] = pa.array([self.contributions[db_id][1] for db_id in db_ids], type=pa.float64())
+        self._write_table(pa.table(contributions), self.state_directory, f"{self.name}_contributions.parquet")
+
+        keys = list(self.aggregates.keys())
+        aggregates = {dimension: [key[index] for key in keys] for index, dimension in enumerate(self.dimensions)}
+        aggregates[self.measure] = pa.array([self.aggregates[key][0] for key in keys], type=pa.float64())
+        aggregates['rowCount'] = pa.array([self.aggregates[key][1] for key in keys], type=pa.int64())
+        self._write_table(pa.table(aggregates), self.output_directory, f"{self.name}.parquet")
+
+    def _write_table(self, table: pa.Table, directory_name: str, file_name: str) -> None:
+        buf = BytesIO()
+        pq.write_table(table, buf)
+        self.data_lake_writer.write_data(self.file_system_name, directory_name, file_name, buf)
+
+    def _add(self, db_id: int, key: Tuple, value: float) -> None:
+        self.contributions[db_id] = (key, value)
+        aggregate = self.aggregates.setdefault(key, [0.0, 0])
+        aggregate[0] += value
+        aggregate[1] += 1
+
+    def _retract(self, db_id: int) -> None:
+        previous = self.contributions.pop(db_id, None)
+        if previous is None:
+            return
+        key, value = previous
+        aggregate = self.aggregates[key]
+        aggregate[0] -= value
+        aggregate[1] -= 1
+        if aggregate[1] == 0:
+            del self.aggregates[key]
+
+    def apply_items(self, items: Iterable[Dict[str, Any]]) -> None:
+        """
+        Apply added or updated items, replacing any previous contribution of the same dbId.
+
+        :param items: Items as returned by the items query.
+        """
+        for item in items:
+            db_id = int(item['dbId'])
+            self._retract(db_id)
+            self._add(db_id, tuple(self.key_function(item)), float(self.value_function(item) or 0.0))
+
+    def apply_deletions(self, db_ids: Iterable[Any]) -> None:
+        """
+        Retract the contributions of deleted items.
+
+        :param db_ids: The deleted dbIds.
+        """
+        for db_id in db_ids:
+            self._retract(int(db_id))
+
+    def reset(self) -> None:
+        """
+        Drop all contributions, used before applying a full synchronization.
+        """
+        self.contributions = {}
+        self.aggregates = {}
@@ -0,0 +1,102 @@
+import json
+import logging
+from datetime import datetime, timezone
+from typing import Any, Dict, Optional
+from shared.delta_fetcher import DeltasResult
+
+
+def _parse_time(value: str) -> Optional[datetime]:
+    if not value:
+        return None
+    parsed = datetime.fromisoformat(value.replace("Z", "+00:00"))
+    # Times without an offset are taken to be UTC.
+    return parsed if parsed.tzinfo else parsed.replace(tzinfo=timezone.utc)
+
+
+class RunMetrics:
+    """
+    Collects the freshness metrics of one syncronization run of an entity.
+
+    - `backlog_events`: delta events that were waiting at the start of the run.
+    - `rows_per_second`: rows written to the lake per second of the run.
+    - `max_lag_seconds`: upper bound of the time from a change until it was written to the lake.
+
+    The delta queries do not select when a change was made, so the lag is bounded by the time since the
+    previous run started, since every change picked up by this run was made after the previous run
+    fetched its deltas.
+    """
+
+    def __init__(self, name: str, previous_run_started_at: str = None, now: datetime = None) -> None:
+        """
+        Initialize the RunMetrics.
+
+        :param name: Name of the entity.
+        :param previous_run_started_at: The ISO 8601 start time of the previous run from the state, if any.
+        :param now: The start time of the run, defaults to now in UTC.
+        """
+        self.name = name
+        self.started_at = now or datetime.now(timezone.utc)
+        self.previous_run_started_at = _parse_time(previous_run_started_at)
+        self.backlog_events = 0
+        self.rows_written = 0
+
+    def record_window(self, deltas: DeltasResult) -> None:
+        """
+        Record a window of deltas handled by the run.
+
+        :param deltas: The deltas of the window.
+        """
+        self.backlog_events += deltas.event_count or deltas.count()
+
+    def record_rows(self, rows: int) -> None:
+        """
+        Record rows written to the lake.
+
+        :param rows: The number of rows.
+        """
+        self.rows_written += rows
+
+    def finish(self, now: datetime = None) -> Dict[str, Any]:
+        """
+        Compute the metrics at the end of the run.
+
+        :param now: The end time of the run, defaults to now in UTC.
+        :return: The metrics, with None for what cannot be computed.
+        """
+        finished_at = now or datetime.now(timezone.utc)
+        duration = (finished_at - self.started_at).total_seconds()
+        max_lag = (finished_at - self.previous_run_started_at).total_seconds() if self.previous_run_started_at else None
+
+        return {
+            "entity": self.name,
+            "started_at": self.started_at.replace(microsecond=0).isoformat(),
+            "duration_seconds": round(duration, 3),
+            "backlog_events": self.backlog_events,
+            "rows_written": self.rows_written,
+            "rows_per_second": round(self.rows_written / duration, 1) if duration > 0 else None,
+            "max_lag_seconds": _round(max_lag),
+        }
+
+
+def _round(value: Optional[float]) -> Optional[float]:
+    return round(value, 1) if value is not None else None
+
+
+class LoggingMetricsSink:
+    """
+    Exports run metrics as a log record.
+
+    The metrics are attached as custom dimensions, which Application Insights stores with the trace of
+    the function app, so they can be charted and alerted on with a query on `customDimensions`.
+    """
+
+    def __init__(self, logger: logging.Logger = None) -> None:
+        self.logger = logger or logging.getLogger("sync_metrics")
+
+    def emit(self, metrics: Dict[str, Any]) -> None:
+        """
+        Export the metrics of a run.
+
+        :param metrics: The metrics from `RunMetrics.finish`.
+        """
+        self.logger.info(f"Sync metrics: {json.dumps(metrics)}", extra={"custom_dimensions": metrics})
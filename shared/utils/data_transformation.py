@@ -1,13 +1,18 @@
 from typing import Any, Dict, List
 
 
-def flatten_json(nested_json: Dict[str, Any], separator: str = '.') -> Dict[str, Any]:
+def flatten_json(nested_json: Dict[str, Any], separator: str = '.', explode_lists: bool = True) -> Dict[str, Any]:
     """
     Flatten a nested JSON object while keeping keys in camelCase and using a distinct separator for nested keys.
+
+    By default list elements get positional keys (`field.0.x`, `field.1.x`, ...), which gives a variable
+    number of sparse columns. With `explode_lists` set to False, lists are kept whole as values, so they
+    become a single Arrow list (or list of struct) column and the column count stays fixed.
     
     Parameters:
         nested_json (Dict[str, Any]): The JSON object to flatten.
         separator (str): The separator used to denote nesting in the keys.
+        explode_lists (bool): Whether to flatten list elements into positional keys.
     
     Returns:
         Dict[str, Any]: A dictionary with flattened keys.
@@ -25,7 +30,7 @@ def flatten_json(nested_json: Dict[str, Any], separator: str = '.') -> Dict[str,
         if isinstance(current_element, dict):
             for key, value in current_element.items():
                 flatten(value, key_prefix + key + separator)
-        elif isinstance(current_element, list):
+        elif isinstance(current_element, list) and explode_lists:
             for index, item in enumerate(current_element):
                 flatten(item, key_prefix + str(index) + separator)
         else:
@@ -35,20 +40,21 @@ def flatten_json(nested_json: Dict[str, Any], separator: str = '.') -> Dict[str,
     return flattened_dict
 
 
-def flatten_list_of_dicts(list_of_dicts: List[Dict[str, Any]], separator: str = '.') -> List[Dict[str, Any]]:
+def flatten_list_of_dicts(list_of_dicts: List[Dict[str, Any]], separator: str = '.', explode_lists: bool = True) -> List[Dict[str, Any]]:
     """
     Flattens a list of nested JSON-like dictionaries, applying the flatten_json function to each dictionary.
 
     Parameters:
         list_of_dicts (List[Dict[str, Any]]): A list of dictionaries to be flattened.
         separator (str): The separator used to denote nesting in the keys, passed to flatten_json.
+        explode_lists (bool): Whether to flatten list elements into positional keys, passed to flatten_json.
 
     Returns:
         List[Dict[str, Any]]: A list of dictionaries where each dictionary has been flattened.
     """
     flattened_dicts = []
     for nested_dict in list_of_dicts:
-        flattened_dict = flatten_json(nested_dict, separator)
+        flattened_dict = flatten_json(nested_dict, separator, explode_lists)
         flattened_dicts.append(flattened_dict)
     return flattened_dicts
 
@@ -1,12 +1,23 @@
 import io
 import csv
+import zlib
+from typing import Iterable, Iterator
 import pyarrow as pa
+import pyarrow.compute as pc
 import pyarrow.parquet as pq
 
 
+# Schema metadata key holding the time a change file was written, in nanoseconds since the epoch.
+# Readers order change files by it, since the modification time in the lake only has second precision.
+WRITTEN_AT_KEY = "written_at_ns"
+
+
 def convert_dicts_to_csv(data: list[dict], separator: str = ';', encoding: str = 'utf-8') -> str:
     """
     Convert a list of dictionaries to a CSV formatted string.
+
+    The header is the union of the keys of all dictionaries, in the order they are first seen.
+    Missing values are written as empty fields.
     
     Parameters:
         data (list[dict]): A list of dictionaries to convert to CSV.
@@ -16,8 +27,8 @@ def convert_dicts_to_csv(data: list[dict], separator: str = ';', encoding: str =
     Returns:
         str: The CSV formatted string.
     """
-    # Get the column names from the first dictionary in the list
-    column_names = list(data[0].keys())
+    # Get the column names from all dictionaries, records may have different keys.
+    column_names = _union_of_keys([data])
 
     # Use StringIO to mimic file writing.
     output = io.StringIO()
@@ -35,23 +46,157 @@ def convert_dicts_to_csv(data: list[dict], separator: str = ';', encoding: str =
     return csv_data
 
 
-def convert_dicts_to_parquet(data: list[dict]) -> io.BytesIO:
+def stream_dicts_to_csv(pages: Iterable[list[dict]], fieldnames: list[str] = None, separator: str = ';',
+                        encoding: str = 'utf-8', compress: bool = False, chunk_size: int = 4 * 2**20) -> Iterator[bytes]:
     """
-    Converts a list of dictionaries to a Parquet format in memory and returns a buffer containing the Parquet data.
+    Stream pages of dictionaries as CSV, encoded and optionally gzip-compressed, in chunks of bytes.
+
+    Only one page and one chunk are held at a time when the columns are declared with `fieldnames`;
+    keys outside the declared columns are left out. Without `fieldnames` the header is the union of
+    the keys of all records, so the pages are collected first to compute it.
+
+    Parameters:
+        pages (Iterable[list[dict]]): Pages of dictionaries, e.g. from a paginated query.
+        fieldnames (list[str]): The declared columns, or None to use the union of keys.
+        separator (str): The separator character used in the CSV file (default is ';').
+        encoding (str): The encoding of the CSV content (default is 'utf-8').
+        compress (bool): Whether to gzip-compress the output.
+        chunk_size (int): Approximate size of the yielded chunks in bytes.
+
+    Returns:
+        Iterator[bytes]: The chunks, concatenated they form the CSV (or .csv.gz) file.
+    """
+    if fieldnames is None:
+        pages = list(pages)
+        fieldnames = _union_of_keys(pages)
+
+    output = io.StringIO()
+    writer = csv.DictWriter(output, fieldnames=fieldnames, delimiter=separator, extrasaction='ignore')
+    compressor = zlib.compressobj(wbits=31) if compress else None  # wbits=31 writes a gzip container.
+    pending = []
+    pending_size = 0
+
+    def drain() -> bytes:
+        data = output.getvalue().encode(encoding)
+        output.seek(0)
+        output.truncate()
+        return compressor.compress(data) if compressor else data
+
+    writer.writeheader()
+    for page in pages:
+        writer.writerows(page)
+        data = drain()
+        pending.append(data)
+        pending_size += len(data)
+        if pending_size >= chunk_size:
+            yield b"".join(pending)
+            pending = []
+            pending_size = 0
+
+    pending.append(drain())
+    if compressor:
+        pending.append(compressor.flush())
+    tail = b"".join(pending)
+    if tail:
+        yield tail
+
+
+def _union_of_keys(pages: Iterable[list[dict]]) -> list[str]:
+    # A dict keeps the order in which the keys are first seen.
+    keys = {}
+    for page in pages:
+        for record in page:
+            keys.update(dict.fromkeys(record))
+    return list(keys)
+
+
+def convert_dicts_to_table(data: list[dict], constant_columns: dict = None) -> pa.Table:
+    """
+    Converts a list of dictionaries to an Arrow table, optionally adding columns holding one value for every row.
 
     Args:
-        data (list[dict]): A list of dictionaries where each dictionary represents a row of data to be converted into Parquet format.
+        data (list[dict]): A list of dictionaries where each dictionary represents a row.
+        constant_columns (dict): Column names mapped to the value every row should have in that column.
 
     Returns:
-        io.BytesIO: A buffer object that contains the Parquet file data as bytes, ready to be read or written to a file.
+        pa.Table: The table.
     """
     table = pa.Table.from_pylist(data)
+    for name, value in (constant_columns or {}).items():
+        column = pa.repeat(pa.scalar(value), table.num_rows)
+        if table.num_columns == 0:
+            table = pa.table({name: column})
+        else:
+            table = table.append_column(name, column)
+    return table
+
+
+def convert_tables_to_parquet(tables: list[pa.Table], sort_key: str = None, metadata: dict = None) -> io.BytesIO:
+    """
+    Concatenates Arrow tables, unifying their schemas, and writes them to a Parquet buffer.
+
+    With a sort key, the rows are sorted by that column, the sort order is recorded in the row group
+    metadata and in the `sort_key` schema metadata, page indexes are written and, where the installed
+    pyarrow supports it, a bloom filter is written for the column. Readers can then skip pages and row
+    groups when looking up or merging on the key. Text keys holding only integers, like dbIds that the
+    API returns as Int64String, are sorted in numeric order. The column keeps its type, so that order
+    is not recorded in the row group metadata.
+
+    Args:
+        tables (list[pa.Table]): The tables to write. Columns missing from a table are filled with nulls, and
+            columns with differing types are promoted to a common type, e.g. int64 and double to double.
+        sort_key (str): Column to sort the rows by, ignored if the table does not have it.
+        metadata (dict): Additional key-value pairs for the schema metadata, e.g. WRITTEN_AT_KEY.
+
+    Returns:
+        io.BytesIO: A buffer object that contains the Parquet file data as bytes.
+    """
+    table = pa.concat_tables(tables, promote_options="permissive") if len(tables) > 1 else tables[0]
+    if metadata:
+        table = table.replace_schema_metadata({**(table.schema.metadata or {}),
+                                               **{key.encode(): str(value).encode() for key, value in metadata.items()}})
     buf = io.BytesIO()
-    pq.write_table(table, buf)
+    if not sort_key or sort_key not in table.column_names:
+        pq.write_table(table, buf)
+        buf.seek(0)
+        return buf
+
+    keys = table[sort_key]
+    if pa.types.is_string(keys.type) or pa.types.is_large_string(keys.type):
+        try:
+            keys = pc.cast(keys, pa.int64())
+        except pa.ArrowInvalid:
+            pass
+    table = table.take(pc.sort_indices(keys))
+    table = table.replace_schema_metadata({**(table.schema.metadata or {}), b"sort_key": sort_key.encode()})
+    options = {"write_page_index": True}
+    if keys.type == table[sort_key].type:
+        options["sorting_columns"] = [pq.SortingColumn(table.column_names.index(sort_key))]
+    try:
+        pq.write_table(table, buf, bloom_filter_options={sort_key: {"ndv": table.num_rows}}, **options)
+    except TypeError:
+        # Bloom filters can only be written by newer versions of pyarrow.
+        buf = io.BytesIO()
+        pq.write_table(table, buf, **options)
     buf.seek(0)
     return buf
 
 
+def convert_dicts_to_parquet(data: list[dict], constant_columns: dict = None, sort_key: str = None) -> io.BytesIO:
+    """
+    Converts a list of dictionaries to a Parquet format in memory and returns a buffer containing the Parquet data.
+
+    Args:
+        data (list[dict]): A list of dictionaries where each dictionary represents a row of data to be converted into Parquet format.
+        constant_columns (dict): Column names mapped to the value every row should have in that column.
+        sort_key (str): Column to sort the rows by, see convert_tables_to_parquet.
+
+    Returns:
+        io.BytesIO: A buffer object that contains the Parquet file data as bytes, ready to be read or written to a file.
+    """
+    return convert_tables_to_parquet([convert_dicts_to_table(data, constant_columns)], sort_key)
+
+
 
 def write_buffer_to_file(buffer: io.BytesIO, file_path: str) -> None:
     """
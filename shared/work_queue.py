@@ -0,0 +1,40 @@
+import json
+import logging
+from typing import Any, Dict
+from azure.storage.queue import QueueClient, TextBase64EncodePolicy
+from azure.core.exceptions import ResourceExistsError
+
+
+class StorageWorkQueue:
+    """
+    Sends work messages to an Azure Storage queue.
+
+    Messages are JSON encoded and base64 wrapped, which is what queue-triggered functions expect by
+    default. Point the connection string at Azurite (`UseDevelopmentStorage=true`) to run locally.
+    """
+
+    def __init__(self, connection_string: str, queue_name: str):
+        """
+        Initialize the StorageWorkQueue.
+
+        :param connection_string: Connection string for the storage account.
+        :param queue_name: Name of the queue, created if it does not exist.
+        """
+        self.queue_name = queue_name
+        self.client = QueueClient.from_connection_string(
+            connection_string, queue_name, message_encode_policy=TextBase64EncodePolicy()
+        )
+        try:
+            self.client.create_queue()
+            logging.info(f"Queue '{queue_name}' created.")
+        except ResourceExistsError:
+            pass
+
+    def send(self, message: Dict[str, Any]) -> None:
+        """
+        Send a message to the queue.
+
+        :param message: The message, must be JSON serializable.
+        """
+        self.client.send_message(json.dumps(message))
+